@@ -0,0 +1,152 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import aiofiles
+
+from config import settings
+
+# 쓰다 만 임시 파일을 정리하기까지 기다리는 시간 (초)
+STALE_TEMP_SECONDS = 3600
+
+
+class AudioCache:
+    """(텍스트, 목소리, 모델) 해시 기반 TTS 음성 파일 캐시
+
+    음성 파일은 AUDIO_DIR 아래에 `tts_<해시>.mp3` 이름으로 한 번만 저장된다.
+    서버 프로세스 여러 개가 같은 디렉토리를 공유하므로 별도 인덱스 없이 파일 크기와
+    수정 시각(= 마지막 사용 시각, 캐시 적중 때 갱신)을 디렉토리에서 직접 읽고,
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 파일부터 삭제한다 (LRU).
+    정리는 디렉토리에 flock을 걸고 하므로 여러 프로세스가 동시에 훑고 지우지 않는다.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, url_prefix: str = "/static/audio"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = asyncio.Lock()
+        # 디렉토리를 마지막으로 훑었을 때의 전체 파일 수/크기 (모든 프로세스 합계)
+        self.entries, self.total_bytes = self._measure(self._scan())
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\x00{voice}\x00{text}".encode("utf-8")).hexdigest()
+
+    def filename_for(self, key: str) -> str:
+        return f"tts_{key}.mp3"
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{self.filename_for(key)}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """캐시된 음성 URL 반환 (없으면 None)"""
+        if not self._touch(self.filename_for(key)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.url_for(key)
+
+    def touch(self, audio_url: str) -> bool:
+        """저장된 동화가 가리키는 음성 파일이 남아 있는지 확인하고 최근 사용으로 표시
+
+        캐시 URL이 아니면 확인할 수 없으므로 그대로 True
+        """
+        if not audio_url or not audio_url.startswith(f"{self.url_prefix}/tts_"):
+            return True
+        return self._touch(os.path.basename(audio_url))
+
+    async def put(self, key: str, audio_bytes: bytes) -> str:
+        """음성 파일 저장 후 URL 반환 (용량 초과 시 LRU 정리)"""
+        filename = self.filename_for(key)
+        path = os.path.join(self.directory, filename)
+        # 다른 프로세스가 쓰다 만 파일을 내보내지 않도록 고유한 임시 파일에 쓴 뒤 교체
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(temp_path, "wb") as audio_file:
+            await audio_file.write(audio_bytes)
+        os.replace(temp_path, path)
+
+        async with self.lock:
+            await asyncio.to_thread(self._evict, filename)
+
+        return self.url_for(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.entries,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _touch(self, filename: str) -> bool:
+        try:
+            os.utime(os.path.join(self.directory, filename))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _scan(self) -> list:
+        """(마지막 사용 시각, 크기, 파일명) 목록 (오래된 임시 파일은 함께 정리)"""
+        files = []
+        now = time.time()
+        with os.scandir(self.directory) as scanned:
+            for entry in scanned:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith("tts_") and entry.name.endswith(".mp3"):
+                    files.append((stat.st_mtime, stat.st_size, entry.name))
+                elif entry.name.startswith("tts_") and entry.name.endswith(".tmp") and now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    self._remove(entry.path)
+        return files
+
+    @staticmethod
+    def _measure(files: list) -> tuple:
+        return len(files), sum(size for _, size, _ in files)
+
+    def _evict(self, keep: str):
+        # 프로세스 간 잠금 (같은 프로세스 안에서는 self.lock이 직렬화)
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            fcntl.flock(directory_fd, fcntl.LOCK_EX)
+            self._evict_locked(keep)
+        finally:
+            os.close(directory_fd)
+
+    def _evict_locked(self, keep: str):
+        files = self._scan()
+        self.entries, self.total_bytes = self._measure(files)
+        if self.total_bytes <= self.max_bytes:
+            return
+        for _, size, filename in sorted(files):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            self._remove(os.path.join(self.directory, filename))
+            self.entries -= 1
+            self.total_bytes -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# 전역 음성 캐시 인스턴스
+audio_cache = AudioCache(settings.AUDIO_DIR, settings.AUDIO_CACHE_MAX_BYTES)
@@ -6,6 +6,7 @@ load_dotenv()
 class Settings:
     # OpenAI API 설정
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # 비워두면 OpenAI 기본 주소 (부하 테스트 시 fake_openai_server 주소)
     
     # TTS 설정
     TTS_VOICE = "nova"
@@ -15,6 +16,24 @@ class Settings:
     IMAGE_MODEL = "dall-e-3"
     IMAGE_SIZE = "1024x1024"
     IMAGE_QUALITY = "standard"
+    # 장면 1 이미지를 참조로 나머지 장면을 images.edit로 생성 (캐릭터 일관성)
+    SCENE_REFERENCE_IMAGES = os.getenv("SCENE_REFERENCE_IMAGES", "true").lower() == "true"
+    IMAGE_EDIT_MODEL = os.getenv("IMAGE_EDIT_MODEL", "gpt-image-1")  # dall-e-2는 투명한 영역만 다시 그림
+    
+    # 생성 이미지 로컬 저장 설정 (DALL-E URL은 일정 시간 후 만료됨)
+    PERSIST_IMAGES = os.getenv("PERSIST_IMAGES", "true").lower() == "true"
+    IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30"))
+    IMAGE_MAX_DOWNLOAD_BYTES = int(os.getenv("IMAGE_MAX_DOWNLOAD_BYTES", str(20 * 1024 * 1024)))
+    DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "20"))  # 이미지 다운로드 공유 커넥션 풀
+    DOWNLOAD_MAX_KEEPALIVE = int(os.getenv("DOWNLOAD_MAX_KEEPALIVE", "10"))
+    DOWNLOAD_KEEPALIVE_EXPIRY = float(os.getenv("DOWNLOAD_KEEPALIVE_EXPIRY", "60"))  # 유휴 연결 유지 시간 (초)
+    IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "82"))
+    IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))  # 목록용 썸네일
+    IMAGE_MEDIUM_SIZE = int(os.getenv("IMAGE_MEDIUM_SIZE", "512"))  # 모바일 화면용
+    IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))  # 생성 이미지 변환용
+    IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", str(min(2, os.cpu_count() or 1))))  # 사진 업로드 전용
+    IMAGE_POOL_MAX_PENDING = int(os.getenv("IMAGE_POOL_MAX_PENDING", "32"))  # 업로드 풀 대기 작업이 초과하면 업로드 거절 (503)
     
     # 스토리 생성 설정
     STORY_MODEL = "gpt-4o"
@@ -24,10 +43,84 @@ class Settings:
     STORY_TEMPERATURE = 0.8  # 창의성 조절
     STORY_MAX_TOKENS = 2000  # 더 긴 스토리 가능
     
+    # 장면 미디어 동시 생성 설정
+    SCENE_FANOUT = os.getenv("SCENE_FANOUT", "true").lower() == "true"  # false면 장면별 순차 생성
+    SCENE_FANOUT_CONCURRENCY = int(os.getenv("SCENE_FANOUT_CONCURRENCY", "13"))  # 동화 1편당 동시 호출 수 제한
+    
+    # 동화 생성 작업 대기열 설정
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # 동시에 처리할 작업 수
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))  # 대기 가능한 최대 작업 수
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "")  # 예: jobs.sqlite3 (비워두면 메모리에만 보관)
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))  # 완료된 작업 보관 기간
+    JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "90"))  # 서버 종료 시 처리 중인 작업을 기다리는 시간
+    # 시작 시 실행 중이던 작업도 복구할지 (멀티 워커 실행 시 start.py가 false로 설정하고 마스터에서 한 번만 복구)
+    JOB_RECOVER_RUNNING = os.getenv("JOB_RECOVER_RUNNING", "true").lower() == "true"
+    
+    # OpenAI 비동기 클라이언트 설정 (공유 커넥션 풀)
+    OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+    
+    # OpenAI 호출 한도 (계정 사용 등급에 맞게 설정, 기본값은 Tier 1 / 0이면 제한 없음)
+    RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true"
+    CHAT_RPM = float(os.getenv("CHAT_RPM", "500"))
+    CHAT_TPM = float(os.getenv("CHAT_TPM", "30000"))
+    IMAGE_RPM = float(os.getenv("IMAGE_RPM", "5"))
+    TTS_RPM = float(os.getenv("TTS_RPM", "50"))
+    RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))  # 한 번에 몰아서 보낼 수 있는 양 (초 단위)
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))  # 429 응답 재시도 횟수
+    SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY") or "1")  # 한도를 나눠 가질 서버 프로세스 수
+    
+    # OpenAI 호출 재시도/제한 시간 설정 (일시적 오류는 지수 백오프 + 지터로 재시도)
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+    PHOTO_ANALYSIS_DEADLINE = float(os.getenv("PHOTO_ANALYSIS_DEADLINE", "30"))
+    STORY_DEADLINE = float(os.getenv("STORY_DEADLINE", "60"))  # 스트리밍 응답 시작까지
+    IMAGE_DEADLINE = float(os.getenv("IMAGE_DEADLINE", "60"))
+    TTS_DEADLINE = float(os.getenv("TTS_DEADLINE", "30"))
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"  # 느린 TTS 요청을 p95 이후 한 번 더 보냄
+    TTS_HEDGE_DELAY = float(os.getenv("TTS_HEDGE_DELAY", "5"))  # 응답 시간 표본이 쌓이기 전 기본 중복 요청 시점
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))  # 중복 요청 비율 상한 (비용 제한)
+    
+    # /themes 응답 캐시 시간 (초, 테마는 배포 때만 바뀌고 ETag로 재검증)
+    THEMES_CACHE_MAX_AGE = int(os.getenv("THEMES_CACHE_MAX_AGE", "3600"))
+    
     # 파일 저장 경로
     STATIC_DIR = "static"
     IMAGES_DIR = os.path.join(STATIC_DIR, "images")
     AUDIO_DIR = os.path.join(STATIC_DIR, "audio")
+    PLACEHOLDER_DIR = os.path.join(STATIC_DIR, "placeholders")  # 로컬 플레이스홀더 SVG
+
+    # 사진 업로드 설정
+    MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB (안내 문구와 일치)
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # 청크 단위로 읽으며 크기 제한 검사
+    PHOTO_STORE_DIR = os.getenv("PHOTO_STORE_DIR", os.path.join("uploads", "photos"))  # 외부에 공개되지 않는 경로
+    PHOTO_STORE_TTL_SECONDS = int(os.getenv("PHOTO_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # 업로드 응답 image_url을 예전처럼 base64 data URL로 반환 (이전 클라이언트 호환용, 기본은 /photos/<photo_id>)
+    UPLOAD_RETURN_DATA_URL = os.getenv("UPLOAD_RETURN_DATA_URL", "false").lower() == "true"
+    
+    # TTS 음성 캐시 설정 (용량 초과 시 오래된 파일부터 삭제)
+    AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+    
+    # 사진 분석 결과 캐시 설정
+    PHOTO_CACHE_TTL_SECONDS = int(os.getenv("PHOTO_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    PHOTO_CACHE_MAX_ENTRIES = int(os.getenv("PHOTO_CACHE_MAX_ENTRIES", "1000"))
+    PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", "")  # 예: cache/photo_analysis (비워두면 메모리에만 보관)
+    
+    # 완성된 동화 저장소 설정 (story_id로 다시 조회, seed가 같은 요청은 저장된 동화 재사용)
+    STORY_STORE_DIR = os.getenv("STORY_STORE_DIR", os.path.join("cache", "stories"))  # 비워두면 메모리에만 보관
+    STORY_STORE_MAX_ENTRIES = int(os.getenv("STORY_STORE_MAX_ENTRIES", "500"))  # 메모리 보관 개수
+    STORY_STORE_TTL_SECONDS = int(os.getenv("STORY_STORE_TTL_SECONDS", str(30 * 24 * 3600)))
+    STORY_FINGERPRINT_TTL_SECONDS = int(os.getenv("STORY_FINGERPRINT_TTL_SECONDS", str(24 * 3600)))
+    
+    # 미리 만든 동화 풀 설정 (사진 없는 요청을 이름만 바꿔 즉시 응답, 켜 두면 요청이 없어도 생성 비용 발생)
+    STORY_POOL_ENABLED = os.getenv("STORY_POOL_ENABLED", "false").lower() == "true"
+    STORY_POOL_DEPTH = int(os.getenv("STORY_POOL_DEPTH", "2"))  # (테마, 연령대, 성별)마다 보관할 동화 수
+    STORY_POOL_THEME_DEPTHS = os.getenv("STORY_POOL_THEME_DEPTHS", "")  # 테마별 덮어쓰기, 예: friendship_skills:4,financial_literacy:1
+    STORY_POOL_REFILL_PER_MINUTE = float(os.getenv("STORY_POOL_REFILL_PER_MINUTE", "4"))  # 분당 새로 만드는 동화 수 상한
+    STORY_POOL_CONCURRENCY = int(os.getenv("STORY_POOL_CONCURRENCY", "2"))  # 동시에 만드는 동화 수
+    STORY_POOL_MAX_AGE_SECONDS = int(os.getenv("STORY_POOL_MAX_AGE_SECONDS", str(24 * 3600)))
 
 settings = Settings()
 
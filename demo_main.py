@@ -1,16 +1,33 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Response
+from fastapi import FastAPI, HTTPException, File, UploadFile, Response, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
 import base64
-from PIL import Image
-import io
+import json
+import tempfile
+
+import aiofiles
 
 from models import (
     StoryRequest, CompleteStoryResponse
 )
 from openai_service import openai_story_service
+from audio_cache import audio_cache
+from photo_cache import photo_analysis_cache
+from story_store import story_store
+from story_pool import story_pool
+from photo_store import photo_store
+from http_downloader import http_downloader
+from image_pipeline import (
+    prepare_upload_photo, sniff_image_type, run_in_pool, pool_stats, shutdown_executor, PoolSaturatedError
+)
+from job_queue import story_job_queue, QueueFullError, JOB_SUCCEEDED, JOB_FAILED
+from metrics import render_metrics
+from rate_limiter import openai_scheduler
+from retry_policy import latency_tracker
+from themes import theme_registry
 from config import settings
 
 # FastAPI 앱 생성
@@ -37,6 +54,20 @@ if not os.path.exists("static"):
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@app.on_event("startup")
+async def startup_event():
+    """서버 시작 시 동화 생성 워커와 동화 풀 보충 작업 시작"""
+    await story_job_queue.start(run_story_job)
+    await story_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """서버 종료 시 워커와 OpenAI 커넥션 풀 정리"""
+    await story_job_queue.stop(settings.JOB_DRAIN_TIMEOUT)
+    await story_pool.stop()
+    await openai_story_service.aclose()
+    shutdown_executor()
+
 @app.get("/")
 async def root():
     """API 서버 상태 확인"""
@@ -56,71 +87,16 @@ async def root():
     }
 
 @app.get("/themes")
-async def get_themes():
-    """사용 가능한 테마 목록 조회"""
-    themes = [
-        {
-            "value": "healthy_eating",
-            "title": "식습관 개선",
-            "emoji": "🥕",
-            "label": "🥕 식습관 개선", 
-            "description": "균형 잡힌 영양 섭취의 중요성을 배워요",
-            "moral": "건강한 몸을 위해서는 다양한 음식을 골고루 먹어야 해요",
-            "keywords": ["건강", "영양", "균형"],
-            "color": "from-green-400 to-emerald-600",
-            "bgColor": "bg-green-50",
-            "examples": ["🥬 채소 친구들의 모험", "🍎 과일 왕국 여행", "🥛 우유와 칼슘 요정"]
-        },
-        {
-            "value": "friendship_skills",
-            "title": "교우관계",
-            "emoji": "🤝", 
-            "label": "🤝 교우관계",
-            "description": "친구 사귀기와 갈등 해결 방법을 배워요",
-            "moral": "진정한 우정은 서로를 이해하고 배려하는 마음에서 시작돼요",
-            "keywords": ["우정", "화해", "소통"],
-            "color": "from-blue-400 to-sky-600",
-            "bgColor": "bg-blue-50",
-            "examples": ["🌈 화해의 무지개", "🎭 새친구 환영 파티", "🤲 마음을 나누는 다리"]
-        },
-        {
-            "value": "safety_habits",
-            "title": "안전습관",
-            "emoji": "🛡️",
-            "label": "🛡️ 안전습관",
-            "description": "일상 속에서 안전을 지키는 방법을 배워요", 
-            "moral": "안전 수칙을 지키는 것은 나와 다른 사람을 보호하는 일이에요",
-            "keywords": ["안전", "조심", "보호"],
-            "color": "from-red-400 to-orange-600",
-            "bgColor": "bg-red-50",
-            "examples": ["🚦 신호등 친구의 가르침", "👮 안전 경찰관과 모험", "🏠 우리 집 안전 점검"]
-        },
-        {
-            "value": "financial_literacy",
-            "title": "경제관념",
-            "emoji": "💰",
-            "label": "💰 경제관념",
-            "description": "용돈 관리와 저축하는 방법을 배워요",
-            "moral": "계획적인 소비와 저축은 미래를 준비하는 지혜로운 습관이에요",
-            "keywords": ["저축", "계획", "현명함"],
-            "color": "from-yellow-400 to-amber-600",
-            "bgColor": "bg-yellow-50",
-            "examples": ["🐷 저금통 돼지의 여행", "💎 보물섬의 지혜", "🏪 꼬마 상인의 이야기"]
-        },
-        {
-            "value": "emotional_intelligence",
-            "title": "감정표현",
-            "emoji": "💝",
-            "label": "💝 감정표현",
-            "description": "감정을 이해하고 올바르게 표현하는 방법을 배워요",
-            "moral": "내 마음을 표현하고 다른 사람의 마음을 이해하는 것이 중요해요",
-            "keywords": ["감정", "공감", "소통"],
-            "color": "from-pink-400 to-rose-600",
-            "bgColor": "bg-pink-50",
-            "examples": ["😊 감정 요정들의 여행", "🤗 마음을 나누는 숲", "💕 위로의 마법사"]
-        }
-    ]
-    return {"themes": themes}
+async def get_themes(request: Request):
+    """사용 가능한 테마 목록 조회 (미리 직렬화한 응답, 바뀌지 않았으면 304)"""
+    headers = {
+        "ETag": theme_registry.etag,
+        "Cache-Control": f"public, max-age={settings.THEMES_CACHE_MAX_AGE}"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if theme_registry.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=theme_registry.themes_json, media_type="application/json", headers=headers)
 
 @app.post("/generate_complete_story", response_model=CompleteStoryResponse)
 async def generate_complete_story(request: StoryRequest, response: Response):
@@ -135,24 +111,14 @@ async def generate_complete_story(request: StoryRequest, response: Response):
                 detail="OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 확인해주세요."
             )
         
-        # 아이 사진 분석 (업로드된 경우)
-        facial_features = None
-        if request.child_profile.photo:
-            try:
-                print(f"📸 {request.child_profile.name}의 사진 분석 중...")
-                facial_features = await openai_story_service.analyze_child_photo(
-                    request.child_profile.photo,
-                    request.child_profile.name, 
-                    request.child_profile.age,
-                    request.child_profile.gender
-                )
-                print(f"✅ 사진 분석 완료!")
-            except Exception as e:
-                print(f"⚠️ 사진 분석 실패, 기본값 사용: {str(e)}")
-                facial_features = None
-        
-        # 동화 생성 서비스 호출 (사진 분석 결과 포함)
-        result = await openai_story_service.generate_complete_story(request, facial_features)
+        # 저장된 동화나 미리 만든 동화가 있으면 파이프라인 없이 바로 반환
+        result = await find_ready_story(request)
+        if result is None:
+            # 아이 사진 분석 (업로드된 경우)
+            facial_features = await analyze_profile_photo(request)
+            
+            # 동화 생성 서비스 호출 (사진 분석 결과 포함)
+            result = await openai_story_service.generate_complete_story(request, facial_features)
         
         # 동화 생성 완료 후 연결 종료하여 timeout 방지
         response.headers["Connection"] = "close"
@@ -168,49 +134,283 @@ async def generate_complete_story(request: StoryRequest, response: Response):
         raise HTTPException(status_code=500, detail=f"동화 생성 중 오류가 발생했습니다: {str(e)}")
 
 
+async def find_ready_story(request: StoryRequest):
+    """바로 돌려줄 수 있는 동화 (같은 seed로 저장된 동화 → 미리 만든 동화 풀 순, 없으면 None)"""
+    story = await story_store.find(request)
+    if story is not None:
+        return await openai_story_service.restore_missing_audio(story)
+    story = await story_pool.take(request)
+    if story is not None:
+        story = await story_store.save(request, story)
+    return story
+
+
+async def analyze_profile_photo(request: StoryRequest):
+    """아이 사진 분석 (업로드된 경우, 실패 시 None)"""
+    if not request.child_profile.photo:
+        return None
+    try:
+        print(f"📸 {request.child_profile.name}의 사진 분석 중...")
+        facial_features = await openai_story_service.analyze_child_photo(
+            request.child_profile.photo,
+            request.child_profile.name, 
+            request.child_profile.age,
+            request.child_profile.gender
+        )
+        print(f"✅ 사진 분석 완료!")
+        return facial_features
+    except Exception as e:
+        print(f"⚠️ 사진 분석 실패, 기본값 사용: {str(e)}")
+        return None
+
+
+@app.post("/generate_complete_story/stream")
+async def generate_complete_story_stream(request: StoryRequest, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """AI 동화 스트리밍 생성 (제목 → 완성된 장면 순으로 전송, NDJSON 또는 SSE)"""
+    print(f"🎯 스트리밍 동화 생성 요청: {request.child_profile.name}, 테마: {request.theme}")
+    
+    # OpenAI API 키 확인
+    if not settings.OPENAI_API_KEY:
+        raise HTTPException(
+            status_code=500,
+            detail="OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 확인해주세요."
+        )
+    
+    def encode(event: dict) -> str:
+        payload = json.dumps(event, ensure_ascii=False)
+        if format == "sse":
+            return f"event: {event['event']}\ndata: {payload}\n\n"
+        return payload + "\n"
+    
+    async def event_stream():
+        try:
+            stored = await find_ready_story(request)
+            if stored is not None:
+                async for kind, value in story_store.replay(stored):
+                    yield encode(openai_story_service.story_event(kind, value))
+                return
+            facial_features = await analyze_profile_photo(request)
+            async for event in openai_story_service.stream_complete_story(request, facial_features):
+                yield encode(event)
+        except Exception as e:
+            print(f"❌ 스트리밍 동화 생성 실패: {str(e)}")
+            yield encode({"event": "error", "detail": f"동화 생성 중 오류가 발생했습니다: {str(e)}"})
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={
+            "Cache-Control": "no-cache, no-store, must-revalidate",
+            "X-Accel-Buffering": "no"  # 프록시 버퍼링 방지
+        }
+    )
+
+
+async def run_story_job(request: StoryRequest, report_progress) -> CompleteStoryResponse:
+    """대기열 워커에서 실행되는 동화 생성 작업 (진행 상황 보고 포함)"""
+    stored = await find_ready_story(request)
+    if stored is not None:
+        events = story_store.replay(stored)
+    else:
+        report_progress(stage="analyzing_photo")
+        facial_features = await analyze_profile_photo(request)
+        report_progress(stage="writing_story")
+        events = openai_story_service.iter_story_pipeline(request, facial_features)
+    
+    completed_scenes = 0
+    async for kind, value in events:
+        if kind == "title":
+            report_progress(stage="generating_media", title=value)
+        elif kind == "scene":
+            completed_scenes += 1
+            report_progress(completed_scenes=completed_scenes)
+        elif kind == "complete":
+            report_progress(total_scenes=value.total_scenes)
+            return value
+
+
+@app.post("/jobs/story", status_code=202)
+async def submit_story_job(request: StoryRequest):
+    """동화 생성 작업 등록 (작업 ID 즉시 반환)"""
+    # OpenAI API 키 확인
+    if not settings.OPENAI_API_KEY:
+        raise HTTPException(
+            status_code=500,
+            detail="OpenAI API 키가 설정되지 않았습니다. 환경변수 OPENAI_API_KEY를 확인해주세요."
+        )
+    
+    try:
+        job = await story_job_queue.submit(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"요청이 많아 잠시 후 다시 시도해주세요: {str(e)}")
+    
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.job_id}",
+        "result_url": f"/jobs/{job.job_id}/result"
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_story_job(job_id: str):
+    """동화 생성 작업 상태 및 진행률 조회"""
+    job = await story_job_queue.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job.to_status()
+
+
+@app.get("/jobs/{job_id}/result", response_model=CompleteStoryResponse)
+async def get_story_job_result(job_id: str):
+    """완료된 동화 생성 작업 결과 조회"""
+    job = await story_job_queue.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"작업이 아직 완료되지 않았습니다 (상태: {job.status}).")
+    return job.result
+
+
+@app.get("/stories/{story_id}", response_model=CompleteStoryResponse)
+async def get_stored_story(story_id: str):
+    """이전에 생성한 동화 다시 조회 (새로고침, 다시 보기)"""
+    story = await story_store.get(story_id)
+    if story is None:
+        raise HTTPException(status_code=404, detail="동화를 찾을 수 없습니다.")
+    return await openai_story_service.restore_missing_audio(story)
+
+
+async def spool_photo_limited(chunks, too_large_status: int = 413) -> tuple[str, int]:
+    """업로드 본문을 청크 단위로 임시 파일에 쓰며 크기 제한과 이미지 형식을 즉시 검사
+
+    메모리에는 청크 하나만 올리고 (임시 파일 경로, 크기)를 반환한다. 임시 파일은 호출한 쪽이 삭제
+    """
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=".img")
+    os.close(fd)
+    header = b""
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as spool_file:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=too_large_status, detail="파일 크기는 10MB 이하여야 합니다.")
+                if len(header) < 16:
+                    # 헤더가 모이는 즉시 형식 확인 (나머지 본문을 읽기 전에 거절)
+                    header += chunk[:16 - len(header)]
+                    if len(header) == 16 and sniff_image_type(header) is None:
+                        raise HTTPException(status_code=400, detail="이미지 파일만 업로드 가능합니다.")
+                await spool_file.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="빈 파일은 업로드할 수 없습니다.")
+        if sniff_image_type(header) is None:
+            raise HTTPException(status_code=400, detail="이미지 파일만 업로드 가능합니다.")
+    except BaseException:
+        remove_temp_file(path)
+        raise
+    return path, size
+
+
+def remove_temp_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def iter_upload_file(file: UploadFile):
+    """UploadFile을 청크 단위로 읽기"""
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def process_uploaded_photo(photo_path: str, size: int, filename: str) -> dict:
+    """임시 파일로 받은 사진 리사이즈 및 응답 생성 (임시 파일은 처리 후 삭제)"""
+    # 이미지 처리 및 리사이즈 (최대 1024x1024, 프로세스 풀에서 파일을 직접 읽어 축소 디코딩)
+    try:
+        jpeg_bytes = await run_in_pool(prepare_upload_photo, photo_path, 1024, 85, workload="upload", reject_when_saturated=True)
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=f"요청이 많아 잠시 후 다시 시도해주세요: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"이미지 처리 중 오류가 발생했습니다: {str(e)}")
+    finally:
+        remove_temp_file(photo_path)
+    
+    # 서버에 저장하고 짧은 사진 ID 발급 (동화 생성 요청에는 photo_id를 사용)
+    photo_id = await photo_store.save(jpeg_bytes)
+    
+    # 미리보기는 저장된 사진 URL (data URL을 돌려주면 클라이언트가 그대로 다시 보내므로 설정한 경우에만)
+    image_url = f"/photos/{photo_id}"
+    if settings.UPLOAD_RETURN_DATA_URL:
+        print(f"⚠️ 이전 클라이언트 호환용 data URL 미리보기 반환: {photo_id} ({len(jpeg_bytes) // 1024}KB)")
+        image_url = f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"
+    
+    return {
+        "success": True,
+        "photo_id": photo_id,
+        "image_url": image_url,
+        "message": "사진이 성공적으로 업로드되었습니다.",
+        "file_info": {
+            "original_filename": filename,
+            "content_type": "image/jpeg",
+            "size": size
+        }
+    }
+
+
+def reject_oversized_request(request: Request, overhead: int = 0, too_large_status: int = 413):
+    """Content-Length가 제한을 넘으면 본문을 읽기 전에 거절"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + overhead:
+        raise HTTPException(status_code=too_large_status, detail="파일 크기는 10MB 이하여야 합니다.")
+
+
 @app.post("/upload_photo")
-async def upload_photo(file: UploadFile = File(...)):
-    """아이 사진 업로드 API"""
+async def upload_photo(request: Request, file: UploadFile = File(...)):
+    """아이 사진 업로드 API (multipart, 이전 클라이언트 호환용)
+    
+    Starlette가 multipart 본문 전체를 먼저 받아 UploadFile에 담아 둔 뒤에 호출되므로
+    크기/형식 검사는 본문을 다 받은 다음에야 이루어진다 (Content-Length 사전 검사만 예외).
+    본문을 받는 도중에 거절하고 메모리를 청크 크기로 제한하려면 /upload_photo/stream을 사용.
+    """
     try:
         # 파일 타입 확인
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="이미지 파일만 업로드 가능합니다.")
         
-        # 파일 크기 확인 (10MB 제한)
-        contents = await file.read()
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="파일 크기는 10MB 이하여야 합니다.")
+        # 파일 크기 확인 (10MB 제한, Content-Length가 있으면 본문을 받기 전에 거절)
+        reject_oversized_request(request, overhead=64 * 1024, too_large_status=400)  # multipart 헤더 여유분
+        photo_path, size = await spool_photo_limited(iter_upload_file(file), too_large_status=400)
         
-        # 이미지 처리 및 리사이즈
-        try:
-            image = Image.open(io.BytesIO(contents))
-            # RGB로 변환 (RGBA나 다른 형식 호환성)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 이미지 리사이즈 (최대 1024x1024)
-            max_size = (1024, 1024)
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Base64로 인코딩
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            image_data_url = f"data:image/jpeg;base64,{image_base64}"
-            
-            return {
-                "success": True,
-                "image_url": image_data_url,
-                "message": "사진이 성공적으로 업로드되었습니다.",
-                "file_info": {
-                    "original_filename": file.filename,
-                    "content_type": "image/jpeg",
-                    "size": len(contents)
-                }
-            }
+        return await process_uploaded_photo(photo_path, size, file.filename)
             
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"이미지 처리 중 오류가 발생했습니다: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ 사진 업로드 실패: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"파일 업로드 중 오류가 발생했습니다: {str(e)}")
+
+
+@app.post("/upload_photo/stream")
+async def upload_photo_stream(request: Request, filename: str = Query("photo")):
+    """아이 사진 업로드 API (요청 본문이 이미지 바이트, multipart 버퍼링 없이 스트리밍으로 읽음)"""
+    try:
+        # 파일 타입 확인
+        if not request.headers.get("content-type", "").startswith('image/'):
+            raise HTTPException(status_code=400, detail="이미지 파일만 업로드 가능합니다.")
+        
+        # 파일 크기 확인 (10MB 제한, 청크 단위로 읽으며 검사)
+        reject_oversized_request(request)
+        photo_path, size = await spool_photo_limited(request.stream())
+        
+        return await process_uploaded_photo(photo_path, size, filename)
             
     except HTTPException:
         raise
@@ -218,6 +418,21 @@ async def upload_photo(file: UploadFile = File(...)):
         print(f"❌ 사진 업로드 실패: {str(e)}")
         raise HTTPException(status_code=500, detail=f"파일 업로드 중 오류가 발생했습니다: {str(e)}")
 
+@app.get("/photos/{photo_id}")
+async def get_photo(photo_id: str):
+    """업로드한 사진 미리보기 (사진 ID는 내용 해시라 추측할 수 없고, 공유 캐시에는 남기지 않음)"""
+    try:
+        photo_bytes = await photo_store.load(photo_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="사진을 찾을 수 없습니다.")
+    return Response(content=photo_bytes, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 수집용 단계별 지연 시간/진행 중 작업 지표"""
+    content, content_type = render_metrics()
+    return Response(content=content, headers={"Content-Type": content_type})
+
 @app.get("/health")
 async def health_check():
     """서비스 상태 확인"""
@@ -244,6 +459,14 @@ async def health_check():
             }
         },
         "openai_api_key": openai_key_status,
+        "audio_cache": audio_cache.stats(),
+        "photo_analysis_cache": photo_analysis_cache.stats(),
+        "story_store": story_store.stats(),
+        "story_pool": story_pool.stats(),
+        "image_pool": pool_stats(),
+        "image_downloads": http_downloader.stats(),
+        "openai_rate_limits": openai_scheduler.stats(),
+        "openai_latency": latency_tracker.stats(),
         "features": [
             "개인화된 동화 생성",
             "AI 일러스트레이션",
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+오프라인 OpenAI 대체 서버 (부하 테스트용)
+
+chat.completions(스트리밍/비전 포함), images.generate, images.edit, audio.speech
+엔드포인트를 흉내 내며, 엔드포인트별 지연 분포와 실패율을 설정할 수 있다.
+
+사용 예:
+    python fake_openai_server.py --port 8100 --image-latency lognormal:8,0.4 --failure-rate 0.02
+    OPENAI_BASE_URL=http://localhost:8100/v1 python start.py
+
+지연 분포 형식: fixed:초 | uniform:최소,최대 | normal:평균,표준편차 | lognormal:중앙값,시그마
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from PIL import Image
+
+
+class LatencyDistribution:
+    """설정 문자열로 정의한 지연 시간 분포"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"지원하지 않는 지연 분포입니다: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, random.gauss(self.params[0], self.params[1]))
+        return random.lognormvariate(math.log(self.params[0]), self.params[1])
+
+
+class FakeOpenAIConfig:
+    """엔드포인트별 지연/실패 설정 (환경변수 또는 명령행 인자)"""
+
+    def __init__(self):
+        self.latency = {
+            "chat": LatencyDistribution(os.getenv("FAKE_CHAT_LATENCY", "lognormal:6,0.3")),
+            "vision": LatencyDistribution(os.getenv("FAKE_VISION_LATENCY", "lognormal:3,0.3")),
+            "image": LatencyDistribution(os.getenv("FAKE_IMAGE_LATENCY", "lognormal:10,0.3")),
+            "edit": LatencyDistribution(os.getenv("FAKE_EDIT_LATENCY", "lognormal:12,0.3")),
+            "tts": LatencyDistribution(os.getenv("FAKE_TTS_LATENCY", "lognormal:1.5,0.3")),
+        }
+        self.failure_rate = {name: float(os.getenv("FAKE_FAILURE_RATE", "0")) for name in self.latency}
+        self.rate_limit_share = float(os.getenv("FAKE_RATE_LIMIT_SHARE", "0.5"))  # 실패 중 429 비율
+        self.time_scale = float(os.getenv("FAKE_TIME_SCALE", "1.0"))  # 모든 지연에 곱하는 배율
+        # 이 토큰 수 이상인 프롬프트만 앞부분 캐시 (OpenAI 기준 1024)
+        self.prompt_cache_min_tokens = int(os.getenv("FAKE_PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+
+config = FakeOpenAIConfig()
+app = FastAPI(title="Fake OpenAI", description="부하 테스트용 OpenAI API 대체 서버")
+
+
+def build_placeholder_png() -> bytes:
+    """DALL-E 응답 대신 내려줄 1024x1024 그라데이션 PNG"""
+    image = Image.linear_gradient("L").resize((1024, 1024)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+PLACEHOLDER_PNG = build_placeholder_png()
+
+
+async def simulate(endpoint: str):
+    """설정된 분포만큼 대기 후, 실패율에 따라 오류 응답 반환 (정상이면 None)"""
+    await asyncio.sleep(config.latency[endpoint].sample() * config.time_scale)
+    if random.random() < config.failure_rate[endpoint]:
+        if random.random() < config.rate_limit_share:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}
+            )
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Internal server error (fake)", "type": "server_error", "code": None}}
+        )
+    return None
+
+
+def fake_story_json() -> str:
+    story_id = uuid.uuid4().hex[:6]
+    scenes = [
+        {
+            "scene_number": number,
+            "text": f"[{story_id}] 장면 {number}: 주인공은 친구들과 함께 새로운 것을 배우며 한 걸음씩 성장했어요. 모두가 웃으며 서로를 도왔답니다.",
+            "image_prompt": f"CONSISTENT STYLE: Soft watercolor children's book illustration, scene {number} of a friendly adventure."
+        }
+        for number in range(1, 7)
+    ]
+    return json.dumps({"title": f"테스트 동화 {story_id}", "scenes": scenes}, ensure_ascii=False)
+
+
+def is_vision_request(body: dict) -> bool:
+    for message in body.get("messages", []):
+        if isinstance(message.get("content"), list):
+            return True
+    return False
+
+
+def usage_for(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    }
+
+
+# 프롬프트 캐시 흉내: 이전 요청과 같은 앞부분을 128토큰 단위로 재사용
+PROMPT_CACHE_BLOCK_TOKENS = 128
+prompt_cache_blocks = set()
+
+
+def prompt_tokens_for(body: dict) -> tuple:
+    """(입력 토큰 수, 캐시 적중 토큰 수) 추정 (UTF-8 4바이트 ≈ 1토큰)"""
+    prompt = b""
+    for message in body.get("messages", []):
+        content = message.get("content")
+        parts = [content] if isinstance(content, str) else [part.get("text") or json.dumps(part) for part in content or []]
+        prompt += f"{message.get('role')}:".encode() + "".join(parts).encode("utf-8")
+    prompt_tokens = max(1, len(prompt) // 4)
+    cached_tokens = 0
+    if prompt_tokens < config.prompt_cache_min_tokens:
+        return prompt_tokens, cached_tokens
+    hit = True
+    for end in range(config.prompt_cache_min_tokens, prompt_tokens + 1, PROMPT_CACHE_BLOCK_TOKENS):
+        block = hashlib.sha256(prompt[:end * 4]).digest()
+        if hit and block in prompt_cache_blocks:
+            cached_tokens = end
+        else:
+            hit = False
+            prompt_cache_blocks.add(block)
+    return prompt_tokens, cached_tokens
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    vision = is_vision_request(body)
+    content = (
+        "round friendly face, large expressive eyes, neat short hair, casual children's clothing, warm appearance"
+        if vision else fake_story_json()
+    )
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o")
+    prompt_tokens, cached_tokens = prompt_tokens_for(body)
+
+    if not body.get("stream"):
+        error = await simulate("vision" if vision else "chat")
+        if error:
+            return error
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage_for(prompt_tokens, len(content) // 2, cached_tokens)
+        }
+
+    # 스트리밍: 전체 지연의 20%를 첫 토큰까지, 나머지를 조각마다 나눠 전송
+    total_latency = config.latency["chat"].sample() * config.time_scale
+    if random.random() < config.failure_rate["chat"]:
+        await asyncio.sleep(total_latency * 0.2)
+        return JSONResponse(status_code=500, content={"error": {"message": "Internal server error (fake)", "type": "server_error"}})
+
+    pieces = [content[index:index + 12] for index in range(0, len(content), 12)]
+
+    async def event_stream():
+        await asyncio.sleep(total_latency * 0.2)
+        per_piece = total_latency * 0.8 / max(len(pieces), 1)
+        for piece in pieces:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(per_piece)
+        done = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }
+        yield f"data: {json.dumps(done)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = dict(done, choices=[], usage=usage_for(prompt_tokens, len(content) // 2, cached_tokens))
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+def image_response(request: Request) -> dict:
+    image_url = str(request.base_url).rstrip("/") + f"/files/{uuid.uuid4().hex}.png"
+    return {"created": int(time.time()), "data": [{"url": image_url, "revised_prompt": "fake revised prompt"}]}
+
+
+@app.post("/v1/images/generations")
+async def images_generations(request: Request):
+    await request.body()
+    error = await simulate("image")
+    return error or image_response(request)
+
+
+@app.post("/v1/images/edits")
+async def images_edits(request: Request):
+    await request.body()
+    error = await simulate("edit")
+    return error or image_response(request)
+
+
+@app.get("/files/{file_name}")
+async def get_file(file_name: str):
+    return Response(content=PLACEHOLDER_PNG, media_type="image/png")
+
+
+@app.post("/v1/audio/speech")
+async def audio_speech(request: Request):
+    body = await request.json()
+    error = await simulate("tts")
+    if error:
+        return error
+    # 텍스트 길이에 비례하는 가짜 MP3 바이트
+    size = 2000 + len(body.get("input", "")) * 200
+    return Response(content=b"ID3" + os.urandom(size), media_type="audio/mpeg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="부하 테스트용 OpenAI API 대체 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chat-latency", help="예: lognormal:6,0.3")
+    parser.add_argument("--vision-latency")
+    parser.add_argument("--image-latency")
+    parser.add_argument("--edit-latency")
+    parser.add_argument("--tts-latency")
+    parser.add_argument("--failure-rate", type=float, help="모든 엔드포인트 공통 실패율 (0~1)")
+    parser.add_argument("--time-scale", type=float, help="모든 지연에 곱하는 배율 (예: 0.1이면 10배 빠르게)")
+    parser.add_argument("--prompt-cache-min-tokens", type=int, help="프롬프트 캐시 최소 토큰 수 (기본 1024)")
+    args = parser.parse_args()
+
+    for endpoint in config.latency:
+        spec = getattr(args, f"{endpoint}_latency")
+        if spec:
+            config.latency[endpoint] = LatencyDistribution(spec)
+    if args.failure_rate is not None:
+        config.failure_rate = {endpoint: args.failure_rate for endpoint in config.latency}
+    if args.time_scale is not None:
+        config.time_scale = args.time_scale
+    if args.prompt_cache_min_tokens is not None:
+        config.prompt_cache_min_tokens = args.prompt_cache_min_tokens
+
+    print("🧪 Fake OpenAI 서버 시작")
+    print(f"📍 OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    for endpoint, distribution in config.latency.items():
+        print(f"   {endpoint}: {distribution.spec}, 실패율 {config.failure_rate[endpoint]}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import time
+from typing import Any, Dict
+
+import httpx
+
+from config import settings
+
+
+class DownloadTooLargeError(ValueError):
+    """응답 본문이 허용 크기를 넘음"""
+
+
+class HTTPDownloader:
+    """원격 파일 다운로드용 공유 비동기 HTTP 클라이언트
+
+    모든 다운로드(생성 이미지 저장, 참조 이미지)가 하나의 커넥션 풀을 재사용하여
+    매번 TCP/TLS 연결을 새로 맺지 않는다. 본문은 스트리밍으로 읽으며 max_bytes를
+    넘는 즉시 중단하고, 디코딩은 호출하는 쪽이 image_pipeline 프로세스 풀에서 처리한다.
+    """
+
+    def __init__(self, timeout: float, max_connections: int, max_keepalive: int, keepalive_expiry: float):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            follow_redirects=True
+        )
+        self.downloads = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+        self.total_seconds = 0.0
+
+    async def fetch(self, url: str, max_bytes: int) -> bytes:
+        """url 본문을 max_bytes까지 내려받음 (초과하면 DownloadTooLargeError)"""
+        started = time.perf_counter()
+        try:
+            async with self.client.stream("GET", url) as response:
+                response.raise_for_status()
+                # 크기를 미리 알 수 있으면 본문을 읽기 전에 거절
+                if int(response.headers.get("content-length") or 0) > max_bytes:
+                    raise DownloadTooLargeError(f"파일 크기가 제한({max_bytes} bytes)을 초과했습니다")
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise DownloadTooLargeError(f"파일 크기가 제한({max_bytes} bytes)을 초과했습니다")
+                    chunks.append(chunk)
+        except Exception:
+            self.failures += 1
+            raise
+        self.downloads += 1
+        self.bytes_downloaded += size
+        self.total_seconds += time.perf_counter() - started
+        return b"".join(chunks)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "downloads": self.downloads,
+            "failures": self.failures,
+            "bytes": self.bytes_downloaded,
+            "avg_seconds": round(self.total_seconds / self.downloads, 3) if self.downloads else 0.0
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# 전역 다운로드 클라이언트 인스턴스
+http_downloader = HTTPDownloader(
+    timeout=settings.IMAGE_DOWNLOAD_TIMEOUT,
+    max_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+    max_keepalive=settings.DOWNLOAD_MAX_KEEPALIVE,
+    keepalive_expiry=settings.DOWNLOAD_KEEPALIVE_EXPIRY
+)
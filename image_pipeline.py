@@ -0,0 +1,202 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image
+
+from config import settings
+from metrics import IMAGE_POOL_QUEUE_DEPTH, IMAGE_POOL_REJECTED
+
+# 변형 이름 → (파일명 접미사, 최대 변 길이, 포맷)
+IMAGE_VARIANTS = {
+    "thumbnail": ("_sm", settings.IMAGE_THUMBNAIL_SIZE, "WEBP"),
+    "medium": ("_md", settings.IMAGE_MEDIUM_SIZE, "WEBP"),
+    "full": ("", None, "WEBP"),
+    "jpeg": ("", None, "JPEG"),  # WebP 미지원 클라이언트용
+}
+
+FILE_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+# images.edit 입력 이미지 용량 제한 (정사각형 PNG, 4MB 미만)
+EDIT_IMAGE_MAX_BYTES = 4 * 1024 * 1024
+
+
+
+class PoolSaturatedError(Exception):
+    """이미지 처리 풀이 포화 상태라 작업을 받을 수 없음"""
+
+
+class ImagePool:
+    """작업 종류별 Pillow 프로세스 풀 (처음 사용할 때 생성)
+
+    업로드 사진 처리와 장면 이미지 변환이 프로세스와 대기열을 따로 써서
+    동화 생성이 몰려도 사진 업로드가 밀리거나 거절되지 않고, 그 반대도 마찬가지다.
+    max_pending이 None이면 대기 작업 수를 제한하지 않는다.
+    """
+
+    def __init__(self, workload: str, workers: int, max_pending: Optional[int] = None):
+        self.workload = workload
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0  # 실행 중 + 대기 중 작업 수
+        self.rejected = 0
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            print(f"🧵 이미지 처리 프로세스 풀 시작: {self.workload} (워커 {self.workers}개)")
+        return self.executor
+
+    async def run(self, func: Callable, *args, reject_when_saturated: bool = False) -> Any:
+        if reject_when_saturated and self.max_pending is not None and self.pending >= self.max_pending:
+            self.rejected += 1
+            IMAGE_POOL_REJECTED.labels(self.workload).inc()
+            raise PoolSaturatedError(f"이미지 처리 대기 작업이 {self.max_pending}건을 초과했습니다")
+
+        self.pending += 1
+        IMAGE_POOL_QUEUE_DEPTH.labels(self.workload).inc()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            IMAGE_POOL_QUEUE_DEPTH.labels(self.workload).dec()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# 작업 종류별 풀 (upload: 사진 업로드 리사이즈, render: 생성 이미지 변형/참조 PNG)
+IMAGE_POOLS = {
+    "upload": ImagePool("upload", settings.IMAGE_UPLOAD_WORKERS, settings.IMAGE_POOL_MAX_PENDING),
+    "render": ImagePool("render", settings.IMAGE_PROCESS_WORKERS),
+}
+
+
+def variant_filename(digest: str, variant: str) -> str:
+    suffix, _, image_format = IMAGE_VARIANTS[variant]
+    return f"{digest}{suffix}.{FILE_EXTENSIONS[image_format]}"
+
+
+def render_variants(image_bytes: bytes, webp_quality: int, jpeg_quality: int) -> Dict[str, bytes]:
+    """원본 이미지를 크기별 WebP/JPEG 변형으로 인코딩 (워커 프로세스에서 실행)"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    rendered = {}
+    for variant, (_, max_side, image_format) in IMAGE_VARIANTS.items():
+        resized = image
+        if max_side and max(image.size) > max_side:
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        if image_format == "WEBP":
+            resized.save(buffer, format="WEBP", quality=webp_quality, method=4)
+        else:
+            resized.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+        rendered[variant] = buffer.getvalue()
+    return rendered
+
+
+def render_edit_png(image_bytes: bytes, max_bytes: int) -> bytes:
+    """images.edit 참조용 정사각형 RGBA PNG로 변환 (워커 프로세스에서 실행, max_bytes 이상이면 절반씩 축소)"""
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+    if image.width != image.height:
+        side = min(image.size)
+        left = (image.width - side) // 2
+        top = (image.height - side) // 2
+        image = image.crop((left, top, left + side, top + side))
+
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        if buffer.tell() < max_bytes or image.width <= 256:
+            return buffer.getvalue()
+        image = image.resize((image.width // 2, image.height // 2), Image.Resampling.LANCZOS)
+
+
+# 이미지 파일 시그니처 (매직 바이트)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """파일 앞부분으로 이미지 형식 판별 (지원하지 않는 형식이면 None)"""
+    for signature, image_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    # HEIC/AVIF는 Pillow가 플러그인 없이 디코딩하지 못하므로 본문을 받기 전에 거절
+    return None
+
+
+def prepare_upload_photo(photo_path: str, max_side: int, quality: int) -> bytes:
+    """업로드 사진 파일을 RGB 변환 후 최대 크기로 줄여 JPEG로 인코딩 (워커 프로세스에서 실행)
+
+    원본은 파일에서 필요한 만큼만 읽으므로 업로드 바이트 전체를 메모리에 두지 않는다.
+    """
+    with Image.open(photo_path) as source:
+        # JPEG는 축소 디코딩(1/2~1/8)으로 원본 전체를 메모리에 풀지 않음
+        source.draft('RGB', (max_side, max_side))
+        image = source
+        # RGB로 변환 (RGBA나 다른 형식 호환성)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # 이미지 리사이즈 (최대 max_side x max_side)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+async def run_in_pool(func: Callable, *args, workload: str = "render", reject_when_saturated: bool = False) -> Any:
+    """workload 종류의 프로세스 풀에서 실행 (reject_when_saturated면 그 풀의 대기 작업이 한도를 넘을 때 즉시 거절)"""
+    return await IMAGE_POOLS[workload].run(func, *args, reject_when_saturated=reject_when_saturated)
+
+
+async def build_variants(image_bytes: bytes) -> Dict[str, bytes]:
+    """이벤트 루프를 막지 않고 프로세스 풀에서 변형 이미지 생성"""
+    return await run_in_pool(
+        render_variants,
+        image_bytes,
+        settings.IMAGE_WEBP_QUALITY,
+        settings.IMAGE_JPEG_QUALITY
+    )
+
+
+async def build_edit_png(image_bytes: bytes) -> bytes:
+    """이벤트 루프를 막지 않고 프로세스 풀에서 images.edit 참조 PNG 생성"""
+    return await run_in_pool(render_edit_png, image_bytes, EDIT_IMAGE_MAX_BYTES)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """작업 종류별 이미지 처리 풀 상태 (대기열 깊이, 거절 횟수)"""
+    return {workload: pool.stats() for workload, pool in IMAGE_POOLS.items()}
+
+
+def shutdown_executor():
+    """서버 종료 시 프로세스 풀 정리"""
+    for pool in IMAGE_POOLS.values():
+        pool.shutdown()
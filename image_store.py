@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Dict, Optional
+
+import aiofiles
+
+from config import settings
+from http_downloader import http_downloader
+from image_pipeline import IMAGE_VARIANTS, build_variants, variant_filename
+
+# 아무도 resolve()하지 않은 백그라운드 저장 결과를 보관하는 시간 (초, 취소된 동화 등)
+UNRESOLVED_RESULT_TTL = 600
+
+
+class ImageStore:
+    """생성된 이미지를 로컬에 영구 저장 (만료되는 DALL-E URL 대체)
+
+    원격 이미지를 공유 다운로드 클라이언트(http_downloader)로 내려받아 내용 해시 기반 파일명으로 IMAGES_DIR에
+    한 번만 저장하고 `/static/images/<해시>.webp` URL을 돌려준다. 크기별 변형
+    (썸네일/중간/원본 WebP, 호환용 JPEG)은 image_pipeline의 프로세스 풀에서 만든다.
+
+    저장은 장면 생성의 임계 경로 밖에서 진행한다: persist_in_background()가 원격 URL을
+    바로 돌려주고, 동화를 완성해 보관하기 직전에 resolve()로 로컬 URL로 바꾼다.
+    """
+
+    def __init__(self, directory: str, url_prefix: str = "/static/images"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.pending: Dict[str, asyncio.Task] = {}  # 원격 URL → 백그라운드 저장 작업 (로컬 URL 반환)
+        self.originals: Dict[str, asyncio.Task] = {}  # 원격 URL → 원본 다운로드 작업 (저장이 끝나면 삭제)
+
+    def persist_in_background(self, image_url: str, label: str = "") -> str:
+        """원격 이미지 저장을 백그라운드로 시작하고 원격 URL을 그대로 반환 (resolve()로 로컬 URL 교체)"""
+        if not image_url or not image_url.startswith("http") or image_url in self.pending:
+            return image_url
+        download = asyncio.create_task(http_downloader.fetch(image_url, settings.IMAGE_MAX_DOWNLOAD_BYTES))
+        self.originals[image_url] = download
+        task = asyncio.create_task(self._store_download(image_url, download, label))
+        self.pending[image_url] = task
+        task.add_done_callback(lambda _: asyncio.get_running_loop().call_later(
+            UNRESOLVED_RESULT_TTL, self._forget, image_url, task
+        ))
+        return image_url
+
+    async def resolve(self, image_url: str) -> str:
+        """백그라운드 저장이 끝나기를 기다려 로컬 URL 반환 (저장 중이 아니거나 실패하면 원래 URL)"""
+        task = self.pending.pop(image_url, None)
+        if task is None:
+            return image_url
+        return await asyncio.shield(task)
+
+    async def aclose(self):
+        """서버 종료 시 진행 중인 저장 작업 취소"""
+        tasks = [*self.pending.values(), *self.originals.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.pending.clear()
+        self.originals.clear()
+
+    async def store_bytes(self, image_bytes: bytes) -> str:
+        """이미지 바이트를 크기별 변형으로 저장하고 원본(full) URL 반환"""
+        digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+
+        if not self._is_complete(digest):
+            rendered = await build_variants(image_bytes)
+            for variant, data in rendered.items():
+                await self._write_atomic(os.path.join(self.directory, variant_filename(digest, variant)), data)
+
+        return f"{self.url_prefix}/{variant_filename(digest, 'full')}"
+
+    async def original_bytes(self, image_url: str) -> bytes:
+        """재인코딩 전 원본 바이트 (백그라운드 저장 중인 원격 URL이면 그 다운로드 결과를 함께 사용)"""
+        download = self.originals.get(image_url)
+        if download is not None:
+            return await asyncio.shield(download)
+        return await self.load_bytes(image_url)
+
+    async def load_bytes(self, image_url: str) -> bytes:
+        """이미지 바이트 (저장소 URL이면 로컬에 저장된 WebP, 원격 URL이면 한 번 내려받은 원본)"""
+        if image_url.startswith(f"{self.url_prefix}/"):
+            path = os.path.join(self.directory, os.path.basename(image_url))
+            async with aiofiles.open(path, "rb") as image_file:
+                return await image_file.read()
+        if image_url.startswith("http"):
+            return await http_downloader.fetch(image_url, settings.IMAGE_MAX_DOWNLOAD_BYTES)
+        raise ValueError(f"불러올 수 없는 이미지 URL: {image_url}")
+
+    def variants_for(self, image_url: str) -> Optional[Dict[str, str]]:
+        """로컬 저장 이미지 URL의 크기별 변형 URL 목록 (저장소 이미지가 아니면 None)"""
+        if not image_url or not image_url.startswith(f"{self.url_prefix}/"):
+            return None
+        digest = os.path.basename(image_url).split(".")[0]
+        if not self._is_complete(digest):
+            return None
+        return {variant: f"{self.url_prefix}/{variant_filename(digest, variant)}" for variant in IMAGE_VARIANTS}
+
+    def _is_complete(self, digest: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(self.directory, variant_filename(digest, variant)))
+            for variant in IMAGE_VARIANTS
+        )
+
+    async def _store_download(self, image_url: str, download: asyncio.Task, label: str) -> str:
+        try:
+            local_url = await self.store_bytes(await download)
+            print(f"💾 {label} 이미지 로컬 저장 완료: {local_url}")
+            return local_url
+        except Exception as e:
+            print(f"⚠️ {label} 이미지 로컬 저장 실패, 원격 URL 사용: {str(e)}")
+            return image_url
+        finally:
+            self.originals.pop(image_url, None)
+
+    def _forget(self, image_url: str, task: asyncio.Task):
+        if self.pending.get(image_url) is task:
+            del self.pending[image_url]
+
+    async def _write_atomic(self, path: str, data: bytes):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(temp_path, "wb") as image_file:
+            await image_file.write(data)
+        os.replace(temp_path, path)
+
+
+# 전역 이미지 저장소 인스턴스
+image_store = ImageStore(settings.IMAGES_DIR)
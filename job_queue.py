@@ -0,0 +1,360 @@
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import settings
+from models import StoryRequest, CompleteStoryResponse
+
+# 작업 상태
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# 진행 상황을 저장소에 기록하는 최소 간격 (초, 장면마다 SQLite에 쓰지 않도록)
+PROGRESS_SAVE_INTERVAL = 1.0
+
+
+class QueueFullError(Exception):
+    """대기열이 가득 차서 작업을 받을 수 없음"""
+
+
+class StoryJob:
+    """동화 생성 작업 하나의 상태"""
+
+    def __init__(self, job_id: str, request: StoryRequest, status: str = JOB_QUEUED, created_at: float = None):
+        self.job_id = job_id
+        self.request = request
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.progress: Dict[str, Any] = {"stage": "queued", "completed_scenes": 0, "total_scenes": None}
+        self.result: Optional[CompleteStoryResponse] = None
+        self.error: Optional[str] = None
+
+    def update_progress(self, **progress):
+        self.progress.update(progress)
+        self.updated_at = time.time()
+
+    def to_status(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class JobStore:
+    """작업을 로컬 SQLite에 보관하여 워커 재시작 후에도 이어서 처리
+
+    서버 프로세스 여러 개가 같은 파일을 공유할 수 있으며, 작업은 claim()에
+    성공한 프로세스 하나만 처리한다.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS story_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                progress TEXT
+            )
+            """
+        )
+        self.connection.commit()
+        self.lock = asyncio.Lock()
+
+    async def save(self, job: StoryJob):
+        # 작업 상태는 이벤트 루프에서 바뀌므로 스레드로 넘기기 전에 직렬화
+        row = (
+            job.job_id,
+            job.status,
+            job.request.model_dump_json(),
+            job.result.model_dump_json() if job.result else None,
+            job.error,
+            job.created_at,
+            job.updated_at,
+            json.dumps(job.progress, ensure_ascii=False)
+        )
+        async with self.lock:
+            await asyncio.to_thread(self._save, row)
+
+    def _save(self, row: tuple):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO story_jobs "
+            "(job_id, status, request, result, error, created_at, updated_at, progress) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            row
+        )
+        self.connection.commit()
+
+    async def save_progress(self, job: StoryJob):
+        """실행 중인 작업의 진행 상황만 기록 (다른 프로세스의 조회용, 완료 상태는 덮어쓰지 않음)"""
+        progress = json.dumps(job.progress, ensure_ascii=False)
+        async with self.lock:
+            await asyncio.to_thread(self._save_progress, job.job_id, progress, job.updated_at)
+
+    def _save_progress(self, job_id: str, progress: str, updated_at: float):
+        self.connection.execute(
+            "UPDATE story_jobs SET progress = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+            (progress, updated_at, job_id, JOB_RUNNING)
+        )
+        self.connection.commit()
+
+    async def claim(self, job: StoryJob) -> bool:
+        """마지막으로 읽은 뒤 바뀌지 않은 작업만 실행 중으로 표시 (다른 프로세스와의 중복 처리 방지)"""
+        async with self.lock:
+            return await asyncio.to_thread(self._claim, job)
+
+    def _claim(self, job: StoryJob) -> bool:
+        claimed_at = time.time()
+        cursor = self.connection.execute(
+            "UPDATE story_jobs SET status = ?, updated_at = ? WHERE job_id = ? AND updated_at = ?",
+            (JOB_RUNNING, claimed_at, job.job_id, job.updated_at)
+        )
+        self.connection.commit()
+        if cursor.rowcount != 1:
+            return False
+        job.status = JOB_RUNNING
+        job.updated_at = claimed_at
+        return True
+
+    async def load(self, job_id: str) -> Optional[StoryJob]:
+        async with self.lock:
+            jobs = await asyncio.to_thread(self._load_rows, "WHERE job_id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    async def delete(self, job_ids: list):
+        async with self.lock:
+            await asyncio.to_thread(self._delete, job_ids)
+
+    def _delete(self, job_ids: list):
+        self.connection.executemany("DELETE FROM story_jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        self.connection.commit()
+
+    def requeue_running(self) -> int:
+        cursor = self.connection.execute(
+            "UPDATE story_jobs SET status = ? WHERE status = ?", (JOB_QUEUED, JOB_RUNNING)
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    def load_all(self) -> list:
+        return self._load_rows("ORDER BY created_at")
+
+    def _load_rows(self, clause: str, params: tuple = ()) -> list:
+        rows = self.connection.execute(
+            f"SELECT job_id, status, request, result, error, created_at, updated_at, progress FROM story_jobs {clause}",
+            params
+        ).fetchall()
+        jobs = []
+        for job_id, status, request, result, error, created_at, updated_at, progress in rows:
+            job = StoryJob(job_id, StoryRequest.model_validate_json(request), status, created_at)
+            job.updated_at = updated_at
+            job.error = error
+            if progress:
+                job.progress = json.loads(progress)
+            if result:
+                job.result = CompleteStoryResponse.model_validate_json(result)
+            jobs.append(job)
+        return jobs
+
+    def close(self):
+        self.connection.close()
+
+
+class StoryJobQueue:
+    """동화 생성 작업 대기열 (제한된 개수의 비동기 워커가 처리)"""
+
+    def __init__(self, workers: int, max_queue_size: int, db_path: str = "", retention_seconds: float = 86400, recover_running: bool = True):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.recover_running = recover_running
+        self.jobs: Dict[str, StoryJob] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.store: Optional[JobStore] = None
+        self.runner: Optional[Callable[[StoryRequest, Callable], Awaitable[CompleteStoryResponse]]] = None
+        self.worker_tasks = []
+        self.active_workers = set()  # 작업을 처리 중인 워커 번호
+        self.progress_tasks = set()  # 저장소에 진행 상황을 기록 중인 작업
+        self.draining = False
+
+    async def start(self, runner: Callable[[StoryRequest, Callable], Awaitable[CompleteStoryResponse]]):
+        """워커 시작 (영구 저장소가 설정된 경우 미완료 작업 복구)"""
+        self.runner = runner
+        self.queue = asyncio.Queue()
+        self.draining = False
+
+        if self.db_path:
+            self.store = JobStore(self.db_path)
+            recovered = 0
+            for job in await asyncio.to_thread(self.store.load_all):
+                self.jobs[job.job_id] = job
+                # 여러 서버 프로세스가 저장소를 공유하면 실행 중인 작업은 다른 프로세스 소유일 수 있으므로
+                # 대기 작업만 가져옴 (중단된 작업은 마스터 프로세스가 requeue_interrupted_jobs로 미리 되돌림)
+                if job.status == JOB_QUEUED or (job.status == JOB_RUNNING and self.recover_running):
+                    # 재시작 전에 끝나지 못한 작업은 처음부터 다시 처리
+                    job.status = JOB_QUEUED
+                    self.queue.put_nowait(job.job_id)
+                    recovered += 1
+            if recovered:
+                print(f"♻️ 미완료 동화 생성 작업 {recovered}건 복구")
+
+        self.worker_tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        print(f"👷 동화 생성 워커 {self.workers}개 시작 (대기열 최대 {self.max_queue_size}건)")
+
+    async def stop(self, drain_timeout: float = 0):
+        """워커 종료
+
+        새 작업 접수를 멈추고, 처리 중인 작업은 drain_timeout초까지 끝나기를 기다린다.
+        그때까지 끝나지 못한 작업과 대기 중인 작업은 영구 저장소에 남아 재시작 시 복구됨
+        """
+        self.draining = True
+        busy_tasks = [task for index, task in enumerate(self.worker_tasks) if index in self.active_workers]
+        for index, task in enumerate(self.worker_tasks):
+            if index not in self.active_workers:
+                task.cancel()
+        if busy_tasks and drain_timeout > 0:
+            print(f"⏳ 처리 중인 동화 생성 작업 {len(busy_tasks)}건 완료 대기 (최대 {drain_timeout:.0f}초)")
+            await asyncio.wait(busy_tasks, timeout=drain_timeout)
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+        await asyncio.gather(*self.progress_tasks, return_exceptions=True)
+        if self.store:
+            self.store.close()
+            self.store = None
+
+    async def submit(self, request: StoryRequest) -> StoryJob:
+        """작업 등록 후 즉시 반환"""
+        if self.draining:
+            raise QueueFullError("서버가 종료 중이라 새 작업을 받을 수 없습니다.")
+        if self.queue.qsize() >= self.max_queue_size:
+            raise QueueFullError(f"대기 중인 작업이 {self.max_queue_size}건을 초과했습니다.")
+
+        await self._prune_expired()
+        job = StoryJob(uuid.uuid4().hex, request)
+        self.jobs[job.job_id] = job
+        if self.store:
+            await self.store.save(job)
+        self.queue.put_nowait(job.job_id)
+        print(f"📥 동화 생성 작업 등록: {job.job_id} (대기 {self.queue.qsize()}건)")
+        return job
+
+    async def lookup(self, job_id: str) -> Optional[StoryJob]:
+        """작업 조회 (이 프로세스가 처리 중이 아니면 다른 서버 프로세스의 결과가 있을 수 있으므로 저장소 확인)
+
+        저장된 작업이 이 프로세스의 작업보다 나중에 갱신된 경우에만 저장된 쪽을 돌려준다.
+        """
+        job = self.jobs.get(job_id)
+        if self.store and (job is None or job.status != JOB_RUNNING):
+            stored = await self.store.load(job_id)
+            if stored and (job is None or stored.updated_at > job.updated_at):
+                return stored
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.workers, "queue_depth": self.queue.qsize() if self.queue else 0, "jobs": counts}
+
+    async def _worker(self, index: int):
+        while not self.draining:
+            job_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != JOB_QUEUED:
+                continue
+
+            if self.store and not await self.store.claim(job):
+                print(f"⏭️ 워커 {index}: 작업 {job_id}는 다른 서버 프로세스가 처리 중")
+                del self.jobs[job_id]
+                continue
+
+            self.active_workers.add(index)
+            job.status = JOB_RUNNING
+            job.update_progress(stage="started")
+            print(f"🏃 워커 {index}: 작업 {job_id} 처리 시작")
+
+            try:
+                job.result = await self.runner(job.request, self._progress_reporter(job))
+                job.status = JOB_SUCCEEDED
+                job.update_progress(stage="done")
+                print(f"✅ 워커 {index}: 작업 {job_id} 완료")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = f"동화 생성 중 오류가 발생했습니다: {str(e)}"
+                job.update_progress(stage="failed")
+                print(f"❌ 워커 {index}: 작업 {job_id} 실패: {str(e)}")
+            finally:
+                self.active_workers.discard(index)
+
+            if self.store:
+                await self.store.save(job)
+
+    def _progress_reporter(self, job: StoryJob) -> Callable:
+        """작업 진행 상황 콜백 (메모리는 매번, 저장소는 PROGRESS_SAVE_INTERVAL마다 갱신)"""
+        last_saved = 0.0
+
+        def report(**progress):
+            nonlocal last_saved
+            job.update_progress(**progress)
+            if self.store and job.updated_at - last_saved >= PROGRESS_SAVE_INTERVAL:
+                last_saved = job.updated_at
+                task = asyncio.create_task(self.store.save_progress(job))
+                self.progress_tasks.add(task)
+                task.add_done_callback(self.progress_tasks.discard)
+
+        return report
+
+    async def _prune_expired(self):
+        """보관 기간이 지난 완료 작업 정리"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in (JOB_SUCCEEDED, JOB_FAILED) and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired and self.store:
+            await self.store.delete(expired)
+
+
+def requeue_interrupted_jobs(db_path: str) -> int:
+    """이전 실행에서 끝나지 못한 작업을 대기 상태로 되돌림 (워커 프로세스를 띄우기 전에 한 번 호출)"""
+    store = JobStore(db_path)
+    try:
+        requeued = store.requeue_running()
+    finally:
+        store.close()
+    if requeued:
+        print(f"♻️ 중단된 동화 생성 작업 {requeued}건을 대기열로 되돌림")
+    return requeued
+
+
+# 전역 작업 대기열 인스턴스
+story_job_queue = StoryJobQueue(
+    workers=settings.JOB_WORKERS,
+    max_queue_size=settings.JOB_QUEUE_SIZE,
+    db_path=settings.JOB_DB_PATH,
+    retention_seconds=settings.JOB_RETENTION_SECONDS,
+    recover_running=settings.JOB_RECOVER_RUNNING
+)
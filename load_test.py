@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+동화 생성 API 부하 테스트
+
+지정한 동시 사용자 수로 /generate_complete_story (또는 스트리밍 엔드포인트)를
+반복 호출하여 지연 시간 분포(p50/p95/p99)와 분당 동화 생성 수를 보고한다.
+실제 OpenAI 비용 없이 측정하려면 fake_openai_server.py와 함께 사용한다.
+(서버의 CHAT_RPM/TTS_RPM 등 호출 한도가 처리량 상한이 되므로 측정 목적에 맞게 조정)
+
+사용 예:
+    python fake_openai_server.py --time-scale 0.2 &
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake TTS_RPM=3000 CHAT_TPM=2000000 uvicorn demo_main:app --port 8000 &
+    python load_test.py --concurrency 20 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List, Optional
+
+import httpx
+
+THEMES = ["식습관 개선", "교우관계", "안전습관", "경제관념", "감정표현"]
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(ratio * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def build_request(photo_id: Optional[str]) -> dict:
+    child_profile = {
+        "name": random.choice(["민준", "서연", "도윤", "하은", "지호"]),
+        "age": random.randint(3, 7),
+        "gender": random.choice(["boy", "girl"])
+    }
+    if photo_id:
+        child_profile["photo"] = photo_id
+    return {"child_profile": child_profile, "theme": random.choice(THEMES)}
+
+
+async def run_complete(client: httpx.AsyncClient, body: dict) -> Optional[float]:
+    """전체 동화 응답 요청 (첫 콘텐츠 시간은 전체 시간과 같음)"""
+    response = await client.post("/generate_complete_story", json=body)
+    response.raise_for_status()
+    return None
+
+
+async def run_stream(client: httpx.AsyncClient, body: dict) -> Optional[float]:
+    """스트리밍 요청 (첫 장면 도착 시간 반환)"""
+    started = time.perf_counter()
+    first_scene = None
+    async with client.stream("POST", "/generate_complete_story/stream", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "scene" and first_scene is None:
+                first_scene = time.perf_counter() - started
+            elif event["event"] == "error":
+                raise RuntimeError(event["detail"])
+    return first_scene
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="동화 생성 API 부하 테스트")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="백엔드 서버 주소")
+    parser.add_argument("--concurrency", type=int, default=10, help="동시 사용자 수")
+    parser.add_argument("--requests", type=int, default=50, help="총 요청 수")
+    parser.add_argument("--mode", choices=["complete", "stream"], default="complete")
+    parser.add_argument("--photo-id", help="요청에 포함할 사진 ID (/upload_photo 결과)")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    runner = run_stream if args.mode == "stream" else run_complete
+    latencies: List[float] = []
+    first_content: List[float] = []
+    errors: List[str] = []
+    remaining = iter(range(args.requests))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+
+        async def user():
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    ttfc = await runner(client, build_request(args.photo_id))
+                    latencies.append(time.perf_counter() - started)
+                    if ttfc is not None:
+                        first_content.append(ttfc)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+
+        print(f"🚀 부하 테스트 시작: {args.url} ({args.mode}), 동시 사용자 {args.concurrency}명, 총 {args.requests}건")
+        started = time.perf_counter()
+        await asyncio.gather(*[user() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+    print("=" * 50)
+    print(f"총 소요 시간: {elapsed:.1f}s")
+    print(f"성공: {len(latencies)}건, 실패: {len(errors)}건")
+    if latencies:
+        print(f"동화 생성 지연 p50: {percentile(latencies, 0.50):.2f}s")
+        print(f"동화 생성 지연 p95: {percentile(latencies, 0.95):.2f}s")
+        print(f"동화 생성 지연 p99: {percentile(latencies, 0.99):.2f}s")
+        print(f"처리량: {len(latencies) / elapsed * 60:.1f} stories/min")
+    if first_content:
+        print(f"첫 장면 도착 p50: {percentile(first_content, 0.50):.2f}s, p95: {percentile(first_content, 0.95):.2f}s")
+    for error in errors[:5]:
+        print(f"  ❌ {error}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
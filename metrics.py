@@ -0,0 +1,131 @@
+import os
+import time
+from typing import Any, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# 원격 호출 지연 분포에 맞춘 버킷 (초)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 45, 60, 90, 120, 180)
+
+STAGE_DURATION = Histogram(
+    "fairytale_stage_duration_seconds",
+    "동화 생성 단계별 소요 시간",
+    ["stage", "model", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_TOTAL = Counter(
+    "fairytale_stage_total",
+    "동화 생성 단계 실행 횟수",
+    ["stage", "model", "outcome"]
+)
+STAGE_IN_FLIGHT = Gauge(
+    "fairytale_stage_in_flight",
+    "현재 진행 중인 동화 생성 단계 수",
+    ["stage"],
+    multiprocess_mode="livesum"
+)
+
+PROMPT_TOKENS = Counter(
+    "fairytale_llm_prompt_tokens_total",
+    "LLM 입력 토큰 수 (cache=hit: 프롬프트 캐시에서 재사용된 토큰)",
+    ["stage", "model", "cache"]
+)
+PROMPT_CACHE_RATIO = Histogram(
+    "fairytale_llm_prompt_cache_ratio",
+    "호출 1회의 입력 토큰 중 프롬프트 캐시 적중 비율",
+    ["stage", "model"],
+    buckets=(0, 0.1, 0.25, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1)
+)
+
+IMAGE_POOL_QUEUE_DEPTH = Gauge(
+    "fairytale_image_pool_queue_depth",
+    "이미지 처리 풀의 실행 중 + 대기 중 작업 수",
+    ["workload"],
+    multiprocess_mode="livesum"
+)
+IMAGE_POOL_REJECTED = Counter(
+    "fairytale_image_pool_rejected_total",
+    "이미지 처리 풀 포화로 거절한 작업 수",
+    ["workload"]
+)
+
+REFERENCE_FANOUT_SPEEDUP = Histogram(
+    "fairytale_scene_reference_speedup",
+    "참조 기반 장면 동시 생성의 장면별 소요 시간 합계 / 실제 걸린 시간",
+    ["model"],
+    buckets=(1, 1.5, 2, 3, 4, 5, 6, 8)
+)
+
+
+class StageSpan:
+    """진행 중인 단계 (outcome에 success/cache_hit/fallback 등을 기록, 기록 없이 끝나면 error)"""
+
+    def __init__(self, stage: str, model: str):
+        self.stage = stage
+        self.model = model
+        self.outcome: Optional[str] = None
+        self.started = time.perf_counter()
+        self.finished = False
+        STAGE_IN_FLIGHT.labels(stage).inc()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def finish(self):
+        """단계 종료 기록 (finally 블록에서 호출)"""
+        if self.finished:
+            return
+        self.finished = True
+        self.outcome = self.outcome or "error"
+        STAGE_IN_FLIGHT.labels(self.stage).dec()
+        STAGE_DURATION.labels(self.stage, self.model, self.outcome).observe(self.elapsed())
+        STAGE_TOTAL.labels(self.stage, self.model, self.outcome).inc()
+
+
+def start_stage(stage: str, model: str = "none") -> StageSpan:
+    """단계 시작 (반드시 try/finally에서 span.finish() 호출)"""
+    return StageSpan(stage, model)
+
+
+def observe_stage(stage: str, model: str, outcome: str, seconds: float):
+    """시작/종료가 한 함수 안에 있지 않은 구간(예: 첫 토큰까지 시간) 기록"""
+    STAGE_DURATION.labels(stage, model, outcome).observe(seconds)
+    STAGE_TOTAL.labels(stage, model, outcome).inc()
+
+
+def observe_reference_fanout(model: str, serial_seconds: float, wall_seconds: float, prepare_seconds: float):
+    """참조 기반 장면 동시 생성 1회 기록 (실제 걸린 시간, 속도 향상 배수, 참조 PNG 변환 시간)"""
+    observe_stage("scene_reference_fanout", model, "success", wall_seconds)
+    observe_stage("scene_reference_prepare", "none", "success", prepare_seconds)
+    REFERENCE_FANOUT_SPEEDUP.labels(model).observe(serial_seconds / wall_seconds if wall_seconds > 0 else 1.0)
+
+
+def _usage_field(data: Any, name: str) -> Any:
+    # 구버전 SDK는 모르는 필드(prompt_tokens_details, 스트리밍 usage)를 dict로 남겨 둠
+    if isinstance(data, dict):
+        return data.get(name)
+    return getattr(data, name, None)
+
+
+def observe_prompt_tokens(stage: str, model: str, usage: Any) -> Tuple[int, int]:
+    """응답 usage에서 전체/캐시 적중 입력 토큰 수 기록 (usage가 없으면 무시)"""
+    prompt_tokens = _usage_field(usage, "prompt_tokens") if usage else 0
+    if not prompt_tokens:
+        return 0, 0
+    cached_tokens = _usage_field(_usage_field(usage, "prompt_tokens_details") or {}, "cached_tokens") or 0
+    PROMPT_TOKENS.labels(stage, model, "hit").inc(cached_tokens)
+    PROMPT_TOKENS.labels(stage, model, "miss").inc(prompt_tokens - cached_tokens)
+    PROMPT_CACHE_RATIO.labels(stage, model).observe(cached_tokens / prompt_tokens)
+    print(f"🧠 {stage} 입력 토큰 {prompt_tokens} (캐시 적중 {cached_tokens})")
+    return prompt_tokens, cached_tokens
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus 텍스트 형식 (멀티 워커면 PROMETHEUS_MULTIPROC_DIR의 값을 합산)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
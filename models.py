@@ -1,16 +1,25 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, field_validator
+from typing import Optional, List, Dict
+
+from themes import theme_registry
 
 
 class ChildProfile(BaseModel):
     name: str
     age: int
     gender: Optional[str] = "boy"  # "boy" | "girl"
-    photo: Optional[str] = None  # base64 encoded image or file path
+    photo: Optional[str] = None  # /upload_photo가 반환한 photo_id (권장) 또는 base64 data URL
 
 class StoryRequest(BaseModel):
     child_profile: ChildProfile
-    theme: str  # 문자열로 받아서 처리
+    theme: str  # 한글 이름("식습관 개선") 또는 /themes의 value("healthy_eating")
+    seed: Optional[int] = None  # 같은 seed면 같은 동화 (저장된 결과 재사용), 다시 만들기는 새 seed 또는 생략
+
+    @field_validator("theme")
+    @classmethod
+    def normalize_theme(cls, theme: str) -> str:
+        """등록된 테마는 한글 이름으로 통일 (알 수 없는 테마는 그대로 두고 기본 가이드라인 사용)"""
+        return theme_registry.canonical_title(theme)
 
 class StoryScene(BaseModel):
     scene_number: int
@@ -18,12 +27,14 @@ class StoryScene(BaseModel):
     image_url: Optional[str] = ""  # 이미지 URL 또는 Base64
     audio_url: Optional[str] = ""  # 오디오 URL
     image_prompt: Optional[str] = ""  # 기존 호환성 유지
+    image_variants: Optional[Dict[str, str]] = None  # 크기별 이미지 URL (thumbnail, medium, full, jpeg)
 
 class Story(BaseModel):
     title: str
     scenes: List[StoryScene]
 
 class CompleteStoryResponse(BaseModel):
+    story_id: Optional[str] = None  # GET /stories/{story_id}로 다시 조회
     story: Story
     character_image: Optional[str] = ""  # 생성된 캐릭터 이미지
     total_scenes: int
@@ -1,15 +1,192 @@
+import asyncio
+import base64
+import random
+import time
+import uuid
 import openai
+import httpx
 import os
-import time
 import json
+import re
+from string import Template
+from types import MappingProxyType
 from typing import Dict, Any
 from config import settings
 from models import (
     StoryRequest, Story, StoryScene, CompleteStoryResponse
 )
+from story_parser import StreamingStoryParser
+from audio_cache import audio_cache
+from photo_cache import photo_analysis_cache
+from image_store import image_store
+from http_downloader import http_downloader
+from placeholder_images import placeholder_images
+from image_pipeline import build_edit_png
+from photo_store import photo_store
+from metrics import start_stage, observe_stage, observe_prompt_tokens, observe_reference_fanout
+from rate_limiter import story_context
+from retry_policy import call_with_policy
+from themes import Theme, theme_registry
+from story_store import story_store
+
+# OpenAI 비동기 클라이언트 초기화 (모든 요청이 하나의 커넥션 풀을 공유)
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE
+    ),
+    timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=10.0)
+)
+client = openai.AsyncOpenAI(
+    api_key=settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL or None,
+    http_client=http_client,
+    max_retries=0  # 재시도는 retry_policy(일시적 오류)와 openai_scheduler(429)가 처리
+)
+
+
+# 동화 생성 시스템 프롬프트 (모든 동화가 똑같이 보내는 고정 앞부분)
+# OpenAI 프롬프트 캐시는 앞부분이 글자 하나까지 같은 요청끼리만 재사용되고 1024토큰 이상부터 적용되므로
+# 모든 테마의 가이드라인, 연령대별 규칙, 장면 구성, 응답 형식까지 고정 내용은 전부 여기에 두고
+# 아이 이름, 나이, 테마 선택, 무작위 변형 요소 같은 요청별 값은 절대 넣지 않는다.
+STORY_SYSTEM_PROMPT_TEMPLATE = """당신은 세계적으로 유명한 아동문학 작가입니다. 교육적 가치와 재미를 모두 갖춘 감동적인 동화를 창작하세요. 응답은 반드시 유효한 JSON 형식으로 해주세요.
+
+사용자가 알려주는 교육 테마를 주제로 한 감동적이고 교육적인 동화를 창작해주세요.
+🎨 사용자가 정해 준 이야기 방향(배울 방법과 이야기 상황)에 맞춰 만들어주세요.
+📖 매번 다른 제목과 내용으로 창작해주세요 (템플릿 사용 금지).
+
+🌟 창작 가이드라인:
+1. 연령 적합성: 주인공 나이의 아이의 언어 발달과 이해력에 맞춘 어휘와 문장 구조
+2. 몰입감: 주인공이 직접 경험하는 듯한 생생한 묘사
+3. 교육적 가치: 교육 테마의 중요성을 강요하지 않고 자연스럽게 깨달을 수 있는 스토리
+4. 감정적 연결: 아이가 공감할 수 있는 상황과 감정 변화
+5. 긍정적 결말: 성장과 배움을 통한 희망적이고 따뜻한 마무리
+
+📚 교육 테마 안내서 (사용자가 고른 테마 항목을 따르세요):
+${theme_guide}
+
+👶 연령대별 규칙 (주인공 나이에 맞는 항목을 따르세요):
+- 3-4세: 한 문장은 짧게(10단어 이내), 의성어·의태어와 반복 표현을 자주 사용, 등장인물은 주인공 포함 3명 이하, 갈등은 아주 작고 금방 해결되며 무서운 장면은 넣지 않기
+- 5-6세: 일상 어휘 위주로 한 문장 15단어 이내, 원인과 결과가 분명한 사건, 주인공이 스스로 선택하는 장면을 한 번 이상 넣기, 감정 이름(기쁨, 속상함, 걱정)을 직접 말해 주기
+- 7-9세: 조금 더 풍부한 어휘와 이어지는 문장 사용 가능, 두 가지 선택지 사이에서 고민하는 장면, 다른 인물의 입장을 생각해 보는 장면, 교훈은 주인공의 행동으로 보여 주기
+
+🎬 장면 구성 (6개 장면의 역할):
+1. 도입: 주인공과 배경 소개, 평범한 하루의 시작
+2. 사건 발생: 테마와 관련된 문제나 궁금증이 생김
+3. 시도: 주인공이 처음 해 본 방법이 잘 되지 않음
+4. 도움과 발견: 조력자나 새로운 경험으로 배울 점을 알게 됨
+5. 실천: 배운 것을 직접 해 보고 변화를 느낌
+6. 마무리: 따뜻한 결말과 자연스러운 교훈, 다음 날에도 이어질 좋은 습관
+
+📖 구성 요구사항:
+- 총 6개 장면으로 구성
+- 각 장면: 2-3문장 (아이가 이해하기 쉬운 길이)
+- 장면별 명확한 전개와 교훈 연결
+- DALL-E 3용 상세한 영어 이미지 프롬프트 포함
+- 이미지 프롬프트의 [CHARACTER]는 사용자가 알려준 주인공 영문 표기로 바꿔 쓰기
+- 이미지 프롬프트에는 글자, 말풍선, 실제 브랜드나 로고를 넣지 않기
+- 모든 장면의 주인공 외형(머리 모양, 옷, 색깔)은 장면 1과 똑같이 유지하기
+
+응답 형식 (JSON):
+{
+    "title": "매력적이고 교육적인 동화 제목",
+    "scenes": [
+        {
+            "scene_number": 1,
+            "text": "생생하고 몰입감 있는 장면 서술",
+            "image_prompt": "CONSISTENT STYLE: Soft watercolor children's book illustration. [CHARACTER] with [KEEP_CONSISTENT_CHARACTER_FEATURES]. [Specific scene description]. Warm pastel colors, soft natural lighting, 2D illustration style, child-friendly background. Character must look identical to previous scenes."
+        }
+    ]
+}"""
+
+
+def _theme_guide_entry(theme: Theme) -> str:
+    return (
+        f"- {theme.title}: {theme.context} 동화\n"
+        f"  핵심 교훈: {', '.join(theme.key_lessons)} / 등장인물: {theme.characters}\n"
+        f"  배경: {theme.setting} / 전할 메시지: {theme.moral}"
+    )
+
+
+# 테마 순서는 theme_registry 정의 순서로 고정 (순서가 바뀌면 캐시된 앞부분이 달라짐)
+STORY_SYSTEM_PROMPT = Template(STORY_SYSTEM_PROMPT_TEMPLATE).substitute(
+    theme_guide="\n".join(_theme_guide_entry(theme) for theme in theme_registry.themes)
+)
+
+# 동화 생성 사용자 프롬프트 (${이름} 자리에 값 대입)
+# 요청마다 바뀌는 테마 선택, 변형 요소, 아이 정보만 담아 고정 앞부분(시스템 프롬프트) 뒤에 붙임
+STORY_PROMPT_TEMPLATE = """📚 교육 테마: ${theme}
+- 목표: ${context} 동화
+
+🎨 이야기 방향: ${variation_theme} 방법을 배우는 ${variation_scenario} 이야기
+
+👧 주인공: ${child_name} (${child_age}세)
+- 이미지 프롬프트 [CHARACTER]: ${child_name}, ${child_age}-year-old Korean ${child_gender}
+"""
+
+class PromptTemplate:
+    """${이름} 자리를 기준으로 미리 쪼개 둔 템플릿 (렌더링 시 빈칸만 채워 join)"""
+
+    def __init__(self, text: str):
+        # re.split 결과: 짝수 위치는 고정 문자열, 홀수 위치는 빈칸 이름
+        pieces = re.split(r"\$\{(\w+)\}", text)
+        self.parts = tuple(pieces)
+        self.slots = tuple((index, pieces[index]) for index in range(1, len(pieces), 2))
+
+    def render(self, **values) -> str:
+        parts = list(self.parts)
+        for index, name in self.slots:
+            parts[index] = str(values[name])
+        return "".join(parts)
+
+
+def _compile_theme_template(theme: Theme) -> PromptTemplate:
+    """테마 고정 부분을 미리 채우고 요청마다 바뀌는 빈칸만 남김"""
+    return PromptTemplate(Template(STORY_PROMPT_TEMPLATE).safe_substitute(context=theme.context))
+
+
+# 테마별로 미리 컴파일한 템플릿 (요청마다 아이 정보와 변형 요소만 대입)
+THEME_PROMPT_TEMPLATES = MappingProxyType({
+    theme.value: _compile_theme_template(theme) for theme in theme_registry.themes
+})
+
+
+class SceneReference:
+    """동화 1편의 장면 1 참조 이미지
+
+    처음 claim()한 장면이 이미지를 만들고 한 번만 PNG로 변환해 publish()하면,
+    나머지 장면은 같은 PNG 버퍼로 images.edit를 동시에 호출한다 (장면마다 다시 내려받거나 변환하지 않음).
+    """
+
+    def __init__(self):
+        self.png: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.claimed = False
+        self.prepare_seconds = 0.0
+        self.edits: list[tuple[float, float]] = []  # 장면별 images.edit (시작, 종료) 시각
+
+    def claim(self) -> bool:
+        """참조 이미지를 만들 장면이면 True (첫 호출만)"""
+        if self.claimed:
+            return False
+        self.claimed = True
+        return True
+
+    def publish(self, png: bytes = None):
+        """참조 PNG 공개 (None이면 실패, 기다리던 장면은 각자 새로 생성)"""
+        if not self.png.done():
+            self.png.set_result(png)
+
+    async def wait(self) -> bytes:
+        return await asyncio.shield(self.png)
+
+    def report(self):
+        """참조 기반 동시 생성 효과 기록 (장면별 소요 시간 합계 대비 실제 걸린 시간, 참조 PNG 변환 시간)"""
+        if not self.edits:
+            return
+        serial_seconds = sum(end - start for start, end in self.edits)
+        wall_seconds = max(end for _, end in self.edits) - min(start for start, _ in self.edits)
+        observe_reference_fanout(settings.IMAGE_EDIT_MODEL, serial_seconds, wall_seconds, self.prepare_seconds)
 
-# OpenAI 클라이언트 초기화
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
 
 class OpenAIStoryService:
     """OpenAI 모델들을 사용한 완전한 동화 생성 서비스"""
@@ -17,12 +194,34 @@ class OpenAIStoryService:
     def __init__(self):
         pass
     
-    async def analyze_child_photo(self, photo_base64: str, child_name: str, child_age: int, child_gender: str) -> str:
-        """업로드된 아이 사진을 분석하여 얼굴 특징 추출"""
+    async def aclose(self):
+        """공유 커넥션 풀 종료 (서버 종료 시 호출)"""
+        await client.close()
+        await image_store.aclose()
+        await http_downloader.aclose()
+    
+    async def analyze_child_photo(self, photo: str, child_name: str, child_age: int, child_gender: str) -> str:
+        """업로드된 아이 사진을 분석하여 얼굴 특징 추출 (같은 사진은 캐시된 결과 재사용)
+        
+        photo는 /upload_photo가 돌려준 사진 ID 또는 base64 data URL
+        """
+        span = start_stage("photo_analysis", "gpt-4o")
         try:
+            cache_key = photo_analysis_cache.make_key(photo, child_age)
+            cached_features = await photo_analysis_cache.get(cache_key)
+            if cached_features:
+                print(f"♻️ {child_name}의 사진 분석 캐시 사용")
+                span.outcome = "cache_hit"
+                return cached_features
+            
             print(f"📸 {child_name}의 사진 분석 중...")
+            # 사진 ID는 캐시에 없을 때만 실제 이미지로 변환
+            photo_data_url = await photo_store.resolve_data_url(photo)
             
-            response = client.chat.completions.create(
+            response = await call_with_policy(
+                "photo_analysis",
+                "chat",
+                client.chat.completions.create,
                 model="gpt-4o",
                 messages=[
                     {
@@ -48,7 +247,7 @@ This analysis will be used purely for artistic character consistency in children
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": photo_base64
+                                    "url": photo_data_url
                                 }
                             }
                         ]
@@ -58,14 +257,25 @@ This analysis will be used purely for artistic character consistency in children
                 temperature=0.3  # 일관성을 위해 낮은 temperature
             )
             
+            observe_prompt_tokens("photo_analysis", "gpt-4o", response.usage)
             facial_features = response.choices[0].message.content
             print(f"✅ 얼굴 특징 분석 완료: {facial_features[:100]}...")
+            if facial_features and "sorry" not in facial_features.lower():
+                # 분석이 거절된 응답은 캐시하지 않음 (캐시 저장에 실패해도 분석 결과는 그대로 사용)
+                try:
+                    await photo_analysis_cache.put(cache_key, facial_features)
+                except Exception as e:
+                    print(f"⚠️ 사진 분석 결과 캐시 저장 실패: {str(e)}")
+            span.outcome = "success"
             return facial_features
             
         except Exception as e:
             print(f"❌ 사진 분석 실패: {str(e)}")
+            span.outcome = "fallback"
             # 기본값 반환
             return f"Korean {child_gender}, {child_age} years old, round face, big expressive eyes, short black hair, fair skin, cheerful expression"
+        finally:
+            span.finish()
 
     def generate_detailed_character_description(self, child_name: str, child_age: int, child_gender: str, facial_features: str = None) -> str:
         """상세한 캐릭터 디스크립션 생성 (DALL-E 3용)"""
@@ -108,214 +318,126 @@ STYLE REQUIREMENTS:
         
         return enhanced_prompt.strip()
 
-    def generate_character_style_guide(self, child_name: str, child_age: int, child_gender: str, facial_features: str = None) -> str:
-        """캐릭터 일관성을 위한 스타일 가이드 생성 (사진 분석 결과 포함)"""
-        if facial_features:
-            character_description = facial_features
-        else:
-            character_description = f"Korean {child_gender}, {child_age} years old, round face, big expressive eyes, short black hair, fair skin"
-            
-        return f"""
-CONSISTENT CHARACTER STYLE GUIDE for {child_name}:
-- Main character: {child_name}, {child_age} years old Korean {child_gender}
-- Character physical features: {character_description}
-- Art style: Soft watercolor children's book illustration, consistent across all scenes
-- Drawing style: Consistent 2D illustration style, not 3D, similar to classic children's storybooks  
-- Character should look EXACTLY the same in every scene with identical facial features, hair, and appearance
-- Color palette: Warm, soft pastels that complement the child's features
-- Background style: Simple, clean, child-friendly environments
-- Lighting: Soft, warm natural lighting throughout all scenes
-- Clothing: Simple, age-appropriate casual clothes that stay consistent
-"""
-
-    def generate_story_prompt(self, child_name: str, child_age: int, child_gender: str, theme: str, facial_features: str = None) -> str:
-        """테마별 동화 생성 프롬프트 작성 (사진 분석 결과 포함)"""
-        
-        theme_guidelines = {
-            "식습관 개선": {
-                "context": "건강한 식습관의 중요성을 배우는",
-                "key_lessons": ["다양한 음식 골고루 먹기", "편식하지 않기", "건강한 간식 선택"],
-                "characters": "영양소 요정들, 건강한 음식 친구들",
-                "setting": "마법의 음식 나라나 건강 레스토랑"
-            },
-            "교우관계": {
-                "context": "친구들과의 올바른 관계 형성을 배우는",
-                "key_lessons": ["배려와 나눔", "협력의 중요성", "다름 인정하기"],
-                "characters": "다양한 성격의 친구들, 지혜로운 선생님",
-                "setting": "학교, 놀이터, 친구들과의 모험"
-            },
-            "안전습관": {
-                "context": "일상생활에서의 안전 수칙을 배우는",
-                "key_lessons": ["교통안전 지키기", "화재 예방", "놀이 안전"],
-                "characters": "안전 수호천사, 경찰관, 소방관",
-                "setting": "집, 학교, 길거리, 놀이터"
-            },
-            "경제관념": {
-                "context": "돈의 소중함과 올바른 소비 습관을 배우는",
-                "key_lessons": ["저축의 중요성", "필요와 욕구 구분", "계획적 소비"],
-                "characters": "돼지 저금통, 은행원, 현명한 할머니",
-                "setting": "상점, 은행, 집안에서의 용돈 관리"
-            },
-            "감정표현": {
-                "context": "자신의 감정을 올바르게 표현하는 방법을 배우는",
-                "key_lessons": ["감정 인식하기", "건전한 표현 방법", "타인 감정 이해"],
-                "characters": "감정 요정들, 이해심 많은 가족",
-                "setting": "가정, 감정의 정원, 마음의 세계"
-            }
-        }
-        
-        current_theme = theme_guidelines.get(theme, theme_guidelines["교우관계"])
-        style_guide = self.generate_character_style_guide(child_name, child_age, child_gender, facial_features)
+    def generate_story_prompt(self, child_name: str, child_age: int, child_gender: str, theme: str, seed: int = None) -> str:
+        """테마별 동화 생성 프롬프트 작성 (미리 채워 둔 테마 템플릿에 아이 정보와 변형 요소만 대입)
         
-        # 테마별 스토리 다양성 요소
-        import random
-        
-        # 테마별 스토리 변형 요소
-        theme_variations = {
-            "식습관 개선": {
-                "themes": [
-                    "편식을 극복하는", "건강한 간식을 선택하는", "다양한 음식을 탐험하는",
-                    "영양 균형을 맞추는", "올바른 식사 예절을 배우는", "물을 충분히 마시는"
-                ],
-                "scenarios": [
-                    "영양소 요정들과 모험하는", "마법의 음식 왕국을 탐험하는", "건강한 요리사가 되는",
-                    "무지개 채소밭을 가꾸는", "영양 탐정이 되는", "건강 레스토랑을 운영하는"
-                ]
-            },
-            "교우관계": {
-                "themes": [
-                    "새로운 친구를 사귀는", "갈등을 평화롭게 해결하는", "친구와 나누는 기쁨을 배우는",
-                    "다름을 인정하고 받아들이는", "협력의 소중함을 깨닫는", "배려하는 마음을 기르는"
-                ],
-                "scenarios": [
-                    "우정의 다리를 만드는", "마음을 나누는 정원에서", "협력의 마법을 배우는",
-                    "친구 구출 대모험", "우정의 보물을 찾는", "마음의 문을 여는"
-                ]
-            },
-            "안전습관": {
-                "themes": [
-                    "교통안전을 지키는", "집에서 안전하게 생활하는", "낯선 사람을 조심하는",
-                    "놀이터에서 안전하게 노는", "응급상황에 대처하는", "인터넷을 안전하게 사용하는"
-                ],
-                "scenarios": [
-                    "안전 수호천사와 함께하는", "안전 탐정이 되어", "안전 마법사로 변신하는",
-                    "안전 왕국을 지키는", "위험 괴물을 물리치는", "안전 히어로가 되는"
-                ]
-            },
-            "경제관념": {
-                "themes": [
-                    "저축의 소중함을 배우는", "필요와 욕구를 구분하는", "용돈을 계획적으로 사용하는",
-                    "돈의 가치를 이해하는", "현명한 소비를 배우는", "나눔의 기쁨을 아는"
-                ],
-                "scenarios": [
-                    "저금통 요정과 모험하는", "경제 왕국을 탐험하는", "현명한 상인이 되는",
-                    "돈의 비밀을 파헤치는", "저축 마법사가 되는", "경제 탐정으로 활약하는"
-                ]
-            },
-            "감정표현": {
-                "themes": [
-                    "기쁨과 슬픔을 균형있게 표현하는", "화가 날 때 올바르게 대처하는", 
-                    "무서움을 극복하는", "부끄러움을 이겨내는", "실망감을 다루는", "질투심을 조절하는"
-                ],
-                "scenarios": [
-                    "감정 요정들을 만나는", "마음의 정원을 가꾸는", "감정 색깔을 찾는",
-                    "마음의 날씨를 바꾸는", "감정 동물 친구들과 놀이하는", "마음의 보석을 찾는"
-                ]
-            }
-        }
-        
-        # 현재 테마에 맞는 변형 요소 선택
-        current_variations = theme_variations.get(theme, theme_variations["교우관계"])
-        random_theme = random.choice(current_variations["themes"])
-        random_scenario = random.choice(current_variations["scenarios"])
-        
-        prompt = f"""
-당신은 세계적으로 유명한 아동문학 작가입니다. {theme}을 주제로 한 감동적이고 교육적인 동화를 창작해주세요.
-
-🎨 {theme} 스토리: {random_theme} 방법을 배우는 {random_scenario} 이야기로 만들어주세요.
-📖 매번 다른 제목과 내용으로 창작해주세요 (템플릿 사용 금지).
-
-📚 작품 정보:
-- 주인공: {child_name} ({child_age}세)
-- 교육 테마: {theme}
-- 목표: {current_theme['context']} 동화
-
-🎯 핵심 교훈: {', '.join(current_theme['key_lessons'])}
-
-🌟 창작 가이드라인:
-1. 연령 적합성: {child_age}세 아이의 언어 발달과 이해력에 맞춘 어휘와 문장 구조
-2. 몰입감: {child_name}이 주인공이 되어 직접 경험하는 듯한 생생한 묘사
-3. 교육적 가치: {theme}의 중요성을 강요하지 않고 자연스럽게 깨달을 수 있는 스토리
-4. 감정적 연결: 아이가 공감할 수 있는 상황과 감정 변화
-5. 긍정적 결말: 성장과 배움을 통한 희망적이고 따뜻한 마무리
-
-🎭 등장인물 활용: {current_theme['characters']}
-🏞️ 배경 설정: {current_theme['setting']}
-
-📖 구성 요구사항:
-- 총 6개 장면으로 구성
-- 각 장면: 2-3문장 (아이가 이해하기 쉬운 길이)
-- 장면별 명확한 전개와 교훈 연결
-- DALL-E 3용 상세한 영어 이미지 프롬프트 포함
-
-응답 형식 (JSON):
-{{
-    "title": "매력적이고 교육적인 동화 제목",
-    "scenes": [
-        {{
-            "scene_number": 1,
-            "text": "생생하고 몰입감 있는 장면 서술",
-            "image_prompt": "CONSISTENT STYLE: Soft watercolor children's book illustration. {child_name}, {child_age}-year-old Korean {child_gender} with [KEEP_CONSISTENT_CHARACTER_FEATURES]. [Specific scene description]. Warm pastel colors, soft natural lighting, 2D illustration style, child-friendly background. Character must look identical to previous scenes."
-        }}
-    ]
-}}
-"""
-        return prompt
+        seed가 있으면 변형 요소도 항상 같게 골라 같은 프롬프트를 만든다.
+        """
+        resolved = theme_registry.resolve(theme)
+        template_theme = resolved or theme_registry.default
+        rng = random.Random(seed) if seed is not None else random
+        return THEME_PROMPT_TEMPLATES[template_theme.value].render(
+            theme=resolved.title if resolved else theme,
+            child_name=child_name,
+            child_age=child_age,
+            child_gender=child_gender,
+            variation_theme=rng.choice(template_theme.variation_themes),
+            variation_scenario=rng.choice(template_theme.variation_scenarios)
+        )
     
-    async def generate_story_with_gpt4o_mini(self, request: StoryRequest, facial_features: str = None) -> Dict[str, Any]:
-        """GPT-4o-mini를 사용한 스토리 생성 (사진 분석 결과 포함)"""
+    def generate_story_prompts(self, requests: list[StoryRequest]) -> list[str]:
+        """여러 요청의 프롬프트를 한 번에 생성 (작업 대기열 워커, 벤치마크용)"""
+        return [
+            self.generate_story_prompt(
+                request.child_profile.name,
+                request.child_profile.age,
+                request.child_profile.gender,
+                request.theme,
+                seed=request.seed
+            )
+            for request in requests
+        ]
+    
+    async def iter_story_with_gpt4o(self, request: StoryRequest):
+        """GPT-4o 스트리밍 응답을 점진적으로 파싱하여 제목/장면 이벤트를 순서대로 전달
+        
+        {"type": "title"} → {"type": "scene"} × N → {"type": "done", "story": 전체 스토리} 순으로 yield
+        """
+        span = start_stage("story_llm", settings.STORY_MODEL)
         try:
-            print(f"📝 GPT-4o-mini로 스토리 생성 중...")
+            print(f"📝 GPT-4o-mini로 스토리 생성 중 (스트리밍)...")
             
             prompt = self.generate_story_prompt(
                 request.child_profile.name,
                 request.child_profile.age,
                 request.child_profile.gender,
                 request.theme,
-                facial_features
+                seed=request.seed
             )
+            # seed가 있으면 OpenAI 샘플링도 고정 (재생성 시 최대한 같은 동화)
+            seed_option = {"seed": request.seed} if request.seed is not None else {}
             
-            response = client.chat.completions.create(
+            stream = await call_with_policy(
+                "story_llm",
+                "chat",
+                client.chat.completions.create,
                 model=settings.STORY_MODEL,
                 messages=[
-                    {
-                        "role": "system", 
-                        "content": "당신은 세계적으로 유명한 아동문학 작가입니다. 교육적 가치와 재미를 모두 갖춘 감동적인 동화를 창작하세요. 응답은 반드시 유효한 JSON 형식으로 해주세요."
-                    },
+                    {"role": "system", "content": STORY_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.8,
-                max_tokens=2000
+                max_tokens=2000,
+                stream=True,
+                **seed_option,
+                extra_body={
+                    # 마지막 청크에 usage(캐시된 입력 토큰 포함) 받기
+                    "stream_options": {"include_usage": True},
+                    # 고정 앞부분이 모든 테마에서 같으므로 동화 요청 전체를 같은 캐시 서버로 보냄
+                    "prompt_cache_key": "story"
+                }
             )
             
-            story_text = response.choices[0].message.content
-            print(f"GPT-4o-mini 응답: {story_text[:200]}...")
+            # 장면 객체가 닫히는 즉시 이벤트 전달
+            parser = StreamingStoryParser()
+            first_token = True
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    observe_prompt_tokens("story_llm", settings.STORY_MODEL, chunk.usage)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if first_token:
+                    first_token = False
+                    observe_stage("story_first_token", settings.STORY_MODEL, "success", span.elapsed())
+                for event in parser.feed(chunk.choices[0].delta.content):
+                    if event["type"] == "scene":
+                        print(f"🧩 장면 {len(parser.scenes)} 텍스트 수신 완료")
+                    yield event
+            span.outcome = "success"
             
-            # JSON 파싱
-            try:
-                json_start = story_text.find('{')
-                json_end = story_text.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_text = story_text[json_start:json_end]
-                    story_data = json.loads(json_text)
-                    print(f"✅ 스토리 생성 완료: {story_data.get('title', '제목 없음')}")
-                    return story_data
-                else:
-                    raise ValueError("JSON 형식을 찾을 수 없습니다")
-            except Exception as e:
-                print(f"⚠️ JSON 파싱 실패: {str(e)}")
+        except Exception as e:
+            print(f"❌ GPT-4o-mini 스토리 생성 실패: {str(e)}")
+            raise e
+        finally:
+            span.finish()
+        
+        story_text = parser.text
+        print(f"GPT-4o-mini 응답: {story_text[:200]}...")
+        
+        # 전체 JSON 파싱
+        parse_span = start_stage("story_parse", settings.STORY_MODEL)
+        try:
+            json_start = story_text.find('{')
+            json_end = story_text.rfind('}') + 1
+            if json_start != -1 and json_end != -1:
+                json_text = story_text[json_start:json_end]
+                story_data = json.loads(json_text)
+                print(f"✅ 스토리 생성 완료: {story_data.get('title', '제목 없음')}")
+                parse_span.outcome = "success"
+            else:
+                raise ValueError("JSON 형식을 찾을 수 없습니다")
+        except Exception as e:
+            print(f"⚠️ JSON 파싱 실패: {str(e)}")
+            parse_span.outcome = "fallback"
+            if parser.scenes:
+                # 잘린 응답이라도 완성된 장면까지는 사용
+                story_data = {
+                    "title": parser.title or f"{request.child_profile.name}의 {request.theme} 이야기",
+                    "scenes": parser.scenes
+                }
+            else:
                 # 기본 구조 반환
-                return {
+                story_data = {
                     "title": f"{request.child_profile.name}의 {request.theme} 이야기",
                     "scenes": [
                         {
@@ -325,22 +447,27 @@ CONSISTENT CHARACTER STYLE GUIDE for {child_name}:
                         }
                     ]
                 }
-                
-        except Exception as e:
-            print(f"❌ GPT-4o-mini 스토리 생성 실패: {str(e)}")
-            raise e
+        finally:
+            parse_span.finish()
+        
+        yield {"type": "done", "story": story_data}
+    
+    async def generate_story_with_gpt4o_mini(self, request: StoryRequest) -> Dict[str, Any]:
+        """GPT-4o-mini를 사용한 스토리 생성 (사진 분석 결과는 이미지 프롬프트에서만 사용)"""
+        async for event in self.iter_story_with_gpt4o(request):
+            if event["type"] == "done":
+                return event["story"]
     
-    async def generate_image_with_dalle3(self, image_prompt: str, scene_number: int, reference_gen_id: str = None) -> tuple[str, str]:
-        """DALL-E 3를 사용한 이미지 생성 (gen_id 기반 일관성)"""
+    async def generate_image_with_dalle3(self, image_prompt: str, scene_number: int) -> str:
+        """DALL-E 3를 사용한 이미지 생성 (실패 시 플레이스홀더 URL)"""
+        span = start_stage("character_image" if scene_number == 0 else "scene_image", settings.IMAGE_MODEL)
         try:
             print(f"🎨 DALL-E 3로 장면 {scene_number} 이미지 생성 중...")
             
-            # gen_id가 있으면 프롬프트에 포함하여 캐릭터 일관성 유지
-            if reference_gen_id:
-                image_prompt = f"[Reference generation ID for character consistency: {reference_gen_id}] {image_prompt}"
-                print(f"🎯 캐릭터 일관성을 위한 Gen ID 참조: {reference_gen_id}")
-            
-            response = client.images.generate(
+            response = await call_with_policy(
+                "character_image" if scene_number == 0 else "scene_image",
+                "image",
+                client.images.generate,
                 model="dall-e-3",
                 prompt=image_prompt,
                 size="1024x1024",  # DALL-E 3 최소 지원 해상도
@@ -349,48 +476,35 @@ CONSISTENT CHARACTER STYLE GUIDE for {child_name}:
             )
             
             image_url = response.data[0].url
+            if settings.PERSIST_IMAGES:
+                # 만료되는 원격 URL은 백그라운드에서 로컬에 저장 (동화를 보관하기 전에 finalize_images로 교체)
+                image_store.persist_in_background(image_url, f"장면 {scene_number}")
             
-            # gen_id 추출 (DALL-E 3 응답에서)
-            gen_id = None
-            if hasattr(response.data[0], 'revised_prompt'):
-                # 실제 API 응답 구조에 따라 조정 필요
-                gen_id = getattr(response.data[0], 'gen_id', None) or f"gen_{scene_number}_{hash(image_prompt) % 10000}"
-            else:
-                # gen_id가 없으면 임시로 생성
-                gen_id = f"gen_{scene_number}_{hash(image_prompt) % 10000}"
-            
-            print(f"✅ 장면 {scene_number} 이미지 생성 완료, Gen ID: {gen_id}")
-            return image_url, gen_id
+            print(f"✅ 장면 {scene_number} 이미지 생성 완료")
+            span.outcome = "success"
+            return image_url
             
         except Exception as e:
             print(f"❌ DALL-E 3 이미지 생성 실패: {str(e)}")
+            span.outcome = "fallback"
             # 실패시 플레이스홀더 이미지 반환
-            placeholder_url = f"https://picsum.photos/1024/1024?random={scene_number}&blur=1"
-            return placeholder_url, None
+            return self.placeholder_image_url(scene_number)
+        finally:
+            span.finish()
     
-    async def generate_scene_with_reference(self, reference_image_url: str, scene_prompt: str, scene_number: int) -> str:
-        """Scene 1을 참조하여 다른 장면들을 images.edit API로 생성"""
+    async def generate_scene_with_reference(self, reference_png: bytes, scene_prompt: str, scene_number: int) -> str:
+        """Scene 1 참조 PNG(SceneReference가 한 번만 변환한 버퍼)로 다른 장면을 images.edit API로 생성"""
+        span = start_stage("scene_image_edit", settings.IMAGE_EDIT_MODEL)
         try:
             print(f"🎨 장면 {scene_number} 이미지 생성 중 (참조 이미지 기반)...")
             
-            # 참조 이미지 다운로드 및 PNG 변환
-            import requests
-            from PIL import Image
-            import io
-            
-            response = requests.get(reference_image_url)
-            if response.status_code != 200:
-                raise Exception(f"참조 이미지 다운로드 실패: {reference_image_url}")
-            
-            # PIL로 이미지를 PNG로 변환
-            image = Image.open(io.BytesIO(response.content))
-            png_buffer = io.BytesIO()
-            image.save(png_buffer, format='PNG')
-            png_buffer.seek(0)
-            
-            # OpenAI images.edit API 호출 (PNG 파일 객체로 전달)
-            edit_response = client.images.edit(
-                image=png_buffer,
+            # OpenAI images.edit API 호출 (모든 장면이 같은 bytes 객체를 공유, 재시도 시에도 전체 본문 전송)
+            edit_response = await call_with_policy(
+                "scene_image_edit",
+                "image",
+                client.images.edit,
+                model=settings.IMAGE_EDIT_MODEL,
+                image=("reference.png", reference_png, "image/png"),
                 prompt=f"""Transform this scene while keeping the SAME CHARACTER with identical appearance: {scene_prompt}
 
 IMPORTANT: The main character must look exactly the same as in the reference image:
@@ -402,132 +516,449 @@ IMPORTANT: The main character must look exactly the same as in the reference ima
                 size="1024x1024"
             )
             
-            edited_image_url = edit_response.data[0].url
+            edited = edit_response.data[0]
+            if edited.url:
+                edited_image_url = edited.url
+                if settings.PERSIST_IMAGES:
+                    image_store.persist_in_background(edited_image_url, f"장면 {scene_number}")
+            else:
+                # gpt-image-1은 URL 없이 base64로만 응답
+                edited_image_url = await image_store.store_bytes(base64.b64decode(edited.b64_json))
             print(f"✅ 장면 {scene_number} 이미지 생성 완료 (참조 기반)")
+            span.outcome = "success"
             return edited_image_url
             
         except Exception as e:
             print(f"❌ 장면 {scene_number} 참조 기반 이미지 생성 실패: {str(e)}")
-            print(f"🔄 DALL-E 3 직접 생성으로 대체...")
-            # 실패시 기본 DALL-E 3로 대체
-            return await self.generate_image_with_dalle3(scene_prompt, scene_number)
+            span.outcome = "fallback"
+        finally:
+            span.finish()
+        
+        print(f"🔄 DALL-E 3 직접 생성으로 대체...")
+        # 실패시 기본 DALL-E 3로 대체 (대체 생성 시간은 scene_image 단계로 따로 기록)
+        return await self.generate_image_with_dalle3(scene_prompt, scene_number)
     
     async def generate_audio_with_tts1(self, text: str, scene_number: int, child_name: str) -> str:
-        """OpenAI TTS-1을 사용한 음성 생성"""
+        """OpenAI TTS-1을 사용한 음성 생성 (같은 텍스트/목소리/모델은 캐시 재사용)"""
+        span = start_stage("scene_tts", settings.TTS_MODEL)
         try:
+            cache_key = audio_cache.make_key(text, settings.TTS_VOICE, settings.TTS_MODEL)
+            cached_url = await audio_cache.get(cache_key)
+            if cached_url:
+                print(f"♻️ 장면 {scene_number} 음성 캐시 사용")
+                span.outcome = "cache_hit"
+                return cached_url
+            
             print(f"🔊 TTS-1로 장면 {scene_number} 음성 생성 중...")
             
-            response = client.audio.speech.create(
-                model="tts-1",
+            response = await call_with_policy(
+                "scene_tts",
+                "tts",
+                client.audio.speech.create,
+                model=settings.TTS_MODEL,
                 voice=settings.TTS_VOICE,  # 설정에서 가져온 목소리
                 input=text
             )
             
-            # 음성 파일 저장
-            audio_filename = f"scene_{scene_number}_{child_name}_{int(time.time())}.mp3"
-            audio_path = os.path.join(settings.AUDIO_DIR, audio_filename)
-            
-            with open(audio_path, "wb") as audio_file:
-                audio_file.write(response.content)
-            
-            audio_url = f"/static/audio/{audio_filename}"
+            # 음성 파일 저장 (내용 해시 기반 파일명)
+            audio_url = await audio_cache.put(cache_key, response.content)
             print(f"✅ 장면 {scene_number} 음성 생성 완료")
+            span.outcome = "success"
             return audio_url
             
         except Exception as e:
             print(f"❌ TTS-1 음성 생성 실패: {str(e)}")
+            span.outcome = "fallback"
             return ""  # 실패시 빈 문자열
+        finally:
+            span.finish()
+    
+    async def finalize_images(self, response: CompleteStoryResponse) -> CompleteStoryResponse:
+        """백그라운드 저장이 끝난 이미지의 원격 URL을 로컬 URL과 크기별 변형으로 교체 (동화를 보관하기 직전에 호출)"""
+        character_image, *image_urls = await asyncio.gather(
+            image_store.resolve(response.character_image),
+            *(image_store.resolve(scene.image_url) for scene in response.story.scenes)
+        )
+        scenes = [
+            scene.model_copy(update={"image_url": image_url, "image_variants": image_store.variants_for(image_url)})
+            for scene, image_url in zip(response.story.scenes, image_urls)
+        ]
+        return response.model_copy(update={
+            "story": response.story.model_copy(update={"scenes": scenes}),
+            "character_image": character_image
+        })
+    
+    async def restore_missing_audio(self, story: CompleteStoryResponse) -> CompleteStoryResponse:
+        """저장된 동화의 음성 중 캐시 용량 정리로 삭제된 것만 다시 생성 (남아 있는 음성은 최근 사용으로 표시)"""
+        missing = [scene for scene in story.story.scenes if not audio_cache.touch(scene.audio_url)]
+        if not missing:
+            return story
+        
+        print(f"🔁 삭제된 음성 {len(missing)}개 다시 생성: '{story.story.title}'")
+        bounded = self.create_media_limiter()
+        audio_urls = await asyncio.gather(*(
+            bounded(self.generate_audio_with_tts1(scene.text, scene.scene_number, ""))
+            for scene in missing
+        ))
+        restored = dict(zip((scene.scene_number for scene in missing), audio_urls))
+        scenes = [
+            scene.model_copy(update={"audio_url": restored[scene.scene_number]}) if scene.scene_number in restored else scene
+            for scene in story.story.scenes
+        ]
+        return story.model_copy(update={"story": story.story.model_copy(update={"scenes": scenes})})
+    
+    def build_scene_image_prompt(self, base_image_prompt: str, character_description: str, scene_number: int) -> str:
+        """장면 이미지용 최종 프롬프트 생성 (2D 동화책 스타일 강조)"""
+        enhanced_prompt = self.enhance_prompt_for_consistency(
+            base_image_prompt, 
+            character_description, 
+            scene_number
+        )
+        
+        # 2D 동화책 스타일 강조 (3D 방지)
+        return f"2D flat illustration, watercolor children's book art style, NOT 3D: {enhanced_prompt}"
+    
+    def build_character_image_prompt(self, request: StoryRequest) -> str:
+        """캐릭터 대표 이미지용 프롬프트 생성"""
+        return f"2D flat illustration, watercolor children's book art style, NOT 3D: Children's book character illustration of {request.child_profile.name}, a {request.child_profile.age}-year-old Korean {request.child_profile.gender}, watercolor style, friendly and warm"
+    
+    def placeholder_image_url(self, scene_number: int) -> str:
+        """플레이스홀더 이미지 URL (비용 절약 / 생성 실패 시, 로컬 SVG)"""
+        return placeholder_images.scene_url(scene_number)
+    
+    def placeholder_character_image_url(self) -> str:
+        """캐릭터 플레이스홀더 이미지 URL"""
+        return placeholder_images.character_url()
+    
+    def extract_scene_specs(self, story_data: Dict[str, Any]) -> list[tuple[int, str, str]]:
+        """스토리 JSON에서 (장면 번호, 텍스트, 이미지 프롬프트) 목록 추출"""
+        return [
+            self.scene_spec_from_data(i, scene_data)
+            for i, scene_data in enumerate(story_data.get("scenes", [])[:settings.MAX_SCENES])  # 최대 6개 장면
+        ]
+    
+    def scene_spec_from_data(self, index: int, scene_data: Dict[str, Any]) -> tuple[int, str, str]:
+        """장면 JSON 하나를 (장면 번호, 텍스트, 이미지 프롬프트)로 변환"""
+        scene_num = scene_data.get("scene_number", index + 1)
+        scene_text = scene_data.get("text", "")
+        base_image_prompt = scene_data.get("image_prompt", f"Children's book illustration, scene {scene_num}")
+        return scene_num, scene_text, base_image_prompt
+    
+    async def generate_scene_media_sequential(self, request: StoryRequest, scene_specs: list, character_description: str, generate_images: bool) -> tuple[list[StoryScene], str]:
+        """장면별 이미지/음성을 순차적으로 생성 (장면 1 참조 이미지로 캐릭터 일관성 유지)"""
+        scenes = []
+        reference = self.create_scene_reference(generate_images)
+        bounded = self.create_media_limiter()
+        
+        for scene_num, scene_text, base_image_prompt in scene_specs:
+            # 이미지 생성
+            if generate_images:
+                enhanced_prompt = self.build_scene_image_prompt(base_image_prompt, character_description, scene_num)
+                image_url = await self.generate_scene_image(enhanced_prompt, scene_num, reference, bounded)
+                
+            else:
+                # 플레이스홀더 이미지 사용 (비용 절약)
+                image_url = self.placeholder_image_url(scene_num)
+                print(f"💰 비용 절약을 위해 장면 {scene_num}에 플레이스홀더 이미지 사용")
+            
+            # TTS-1로 음성 생성
+            audio_url = await self.generate_audio_with_tts1(scene_text, scene_num, request.child_profile.name)
+            
+            scenes.append(StoryScene(
+                scene_number=scene_num,
+                text=scene_text,
+                image_url=image_url,
+                audio_url=audio_url,
+                image_variants=image_store.variants_for(image_url)
+            ))
+        
+        if reference:
+            reference.report()
+        
+        # 캐릭터 이미지도 생성 (선택적)
+        if generate_images:
+            character_image = await self.generate_image_with_dalle3(self.build_character_image_prompt(request), 0)
+        else:
+            character_image = self.placeholder_character_image_url()
+        
+        return scenes, character_image
+    
+    def create_media_limiter(self):
+        """동화 1편의 동시 OpenAI 호출 수를 제한하는 래퍼 생성"""
+        semaphore = asyncio.Semaphore(settings.SCENE_FANOUT_CONCURRENCY)
+        
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+        
+        return bounded
+    
+    async def generate_scene_media(self, request: StoryRequest, scene_spec: tuple[int, str, str], character_description: str, generate_images: bool, bounded, generate_audio: bool = True, reference: SceneReference = None) -> StoryScene:
+        """한 장면의 이미지와 음성을 동시에 생성 (실패 시 장면 단위로 대체)
+        
+        generate_audio=False면 음성은 만들지 않고 audio_url을 비워 둔다 (동화 풀의 이름이 나오는 장면).
+        reference가 있으면 먼저 시작한 장면이 참조 이미지를 만들고 나머지는 그 참조로 images.edit
+        """
+        scene_num, scene_text, base_image_prompt = scene_spec
+        
+        if generate_audio:
+            audio_task = bounded(self.generate_audio_with_tts1(scene_text, scene_num, request.child_profile.name))
+        else:
+            audio_task = asyncio.sleep(0, result="")
+        if generate_images:
+            image_task = self.generate_scene_image(
+                self.build_scene_image_prompt(base_image_prompt, character_description, scene_num),
+                scene_num,
+                reference,
+                bounded
+            )
+            audio_url, image_result = await asyncio.gather(audio_task, image_task, return_exceptions=True)
+            if isinstance(image_result, BaseException):
+                print(f"❌ 장면 {scene_num} 이미지 생성 실패: {str(image_result)}")
+                image_url = self.placeholder_image_url(scene_num)
+            else:
+                image_url = image_result
+        else:
+            # 플레이스홀더 이미지 사용 (비용 절약)
+            audio_url = (await asyncio.gather(audio_task, return_exceptions=True))[0]
+            image_url = self.placeholder_image_url(scene_num)
+        
+        if isinstance(audio_url, BaseException):
+            print(f"❌ 장면 {scene_num} 음성 생성 실패: {str(audio_url)}")
+            audio_url = ""
+        
+        return StoryScene(
+            scene_number=scene_num,
+            text=scene_text,
+            image_url=image_url,
+            audio_url=audio_url,
+            image_variants=image_store.variants_for(image_url)
+        )
+    
+    def create_scene_reference(self, generate_images: bool):
+        """동화 1편의 장면 참조 이미지 (이미지 생성을 안 하거나 SCENE_REFERENCE_IMAGES=false면 None)"""
+        if generate_images and settings.SCENE_REFERENCE_IMAGES:
+            return SceneReference()
+        return None
+    
+    async def generate_scene_image(self, image_prompt: str, scene_number: int, reference: SceneReference, bounded) -> str:
+        """장면 이미지 생성 (reference가 없으면 장면마다 따로 생성)"""
+        if reference is None:
+            return await bounded(self.generate_image_with_dalle3(image_prompt, scene_number))
+        if reference.claim():
+            return await self.generate_reference_image(image_prompt, scene_number, reference, bounded)
+        
+        # 참조 이미지를 기다리는 동안은 동시 호출 슬롯을 차지하지 않음
+        reference_png = await reference.wait()
+        if reference_png is None:
+            return await bounded(self.generate_image_with_dalle3(image_prompt, scene_number))
+        started = time.perf_counter()
+        image_url = await bounded(self.generate_scene_with_reference(reference_png, image_prompt, scene_number))
+        reference.edits.append((started, time.perf_counter()))
+        return image_url
+    
+    async def generate_reference_image(self, image_prompt: str, scene_number: int, reference: SceneReference, bounded) -> str:
+        """참조 장면 이미지를 만들고 images.edit용 PNG로 한 번만 변환해 공개"""
+        reference_png = None
+        image_url = self.placeholder_image_url(scene_number)
+        try:
+            image_url = await bounded(self.generate_image_with_dalle3(image_prompt, scene_number))
+            if image_url == self.placeholder_image_url(scene_number):
+                return image_url
+            started = time.perf_counter()
+            # 저장소의 WebP(재인코딩본)가 아니라 내려받은 원본으로 참조 PNG를 만들어 압축 손실이 장면마다 옮지 않도록 함
+            reference_png = await build_edit_png(await image_store.original_bytes(image_url))
+            reference.prepare_seconds = time.perf_counter() - started
+            print(f"🎯 장면 {scene_number} 참조 이미지 준비 완료 ({len(reference_png) // 1024}KB, {reference.prepare_seconds:.2f}초)")
+            return image_url
+        except Exception as e:
+            print(f"⚠️ 참조 이미지 준비 실패, 장면별로 생성: {str(e)}")
+            return image_url
+        finally:
+            reference.publish(reference_png)
+    
+    async def generate_character_image(self, request: StoryRequest, generate_images: bool, bounded) -> str:
+        """캐릭터 대표 이미지 생성 (실패 시 플레이스홀더)"""
+        if not generate_images:
+            return self.placeholder_character_image_url()
+        try:
+            character_image = await bounded(self.generate_image_with_dalle3(self.build_character_image_prompt(request), 0))
+            return character_image
+        except Exception as e:
+            print(f"❌ 캐릭터 이미지 생성 실패: {str(e)}")
+            return self.placeholder_character_image_url()
+    
+    async def iter_story_pipeline(self, request: StoryRequest, facial_features: str = None):
+        """스토리 텍스트 스트리밍과 장면 미디어 생성을 겹쳐서 실행
+        
+        장면 JSON이 닫히는 즉시 해당 장면의 이미지/음성 생성을 시작하고,
+        ("title", 제목) → 완성된 순서대로 ("scene", StoryScene) → ("complete", CompleteStoryResponse) 를 yield
+        """
+        character_description = self.generate_detailed_character_description(
+            request.child_profile.name, 
+            request.child_profile.age, 
+            request.child_profile.gender,
+            facial_features
+        )
+        generate_images = os.getenv("GENERATE_IMAGES", "false").lower() == "true"
+        bounded = self.create_media_limiter()
+        reference = self.create_scene_reference(generate_images)
+        queue = asyncio.Queue()
+        scene_tasks = []
+        
+        def dispatch_scene(scene_data: Dict[str, Any]):
+            if len(scene_tasks) >= settings.MAX_SCENES:  # 최대 6개 장면
+                return
+            scene_spec = self.scene_spec_from_data(len(scene_tasks), scene_data)
+            task = asyncio.create_task(
+                self.generate_scene_media(request, scene_spec, character_description, generate_images, bounded, reference=reference)
+            )
+            task.add_done_callback(lambda finished: queue.put_nowait(("scene", finished)))
+            scene_tasks.append(task)
+        
+        async def consume_story_stream():
+            try:
+                title_sent = False
+                async for event in self.iter_story_with_gpt4o(request):
+                    if event["type"] == "title":
+                        title_sent = True
+                        await queue.put(("title", event["title"]))
+                    elif event["type"] == "scene":
+                        dispatch_scene(event["scene"])
+                    elif event["type"] == "done":
+                        story_data = event["story"]
+                        title = story_data.get("title", f"{request.child_profile.name}의 {request.theme} 이야기")
+                        if not title_sent:
+                            await queue.put(("title", title))
+                        # 스트리밍 중 파싱되지 않은 장면 처리
+                        for scene_data in story_data.get("scenes", [])[len(scene_tasks):]:
+                            dispatch_scene(scene_data)
+                        await queue.put(("story_done", title))
+            except Exception as e:
+                await queue.put(("error", e))
+        
+        # 캐릭터 이미지는 스토리와 무관하므로 바로 시작
+        # 이 동화의 모든 OpenAI 호출을 하나의 공정 대기열 단위로 묶음 (장면 작업은 story_task에서 생성되어 컨텍스트를 물려받음)
+        context = story_context(uuid.uuid4().hex)
+        started = time.perf_counter()
+        character_task = asyncio.create_task(self.generate_character_image(request, generate_images, bounded), context=context)
+        story_task = asyncio.create_task(consume_story_stream(), context=context)
+        
+        try:
+            title = None
+            scenes = []
+            while title is None or len(scenes) < len(scene_tasks):
+                kind, value = await queue.get()
+                if kind == "error":
+                    raise value
+                elif kind == "title":
+                    yield "title", value
+                elif kind == "scene":
+                    scene = value.result()
+                    if not scenes:
+                        observe_stage("story_first_scene", settings.STORY_MODEL, "success", time.perf_counter() - started)
+                    scenes.append(scene)
+                    yield "scene", scene
+                elif kind == "story_done":
+                    title = value
+            
+            scenes = [task.result() for task in scene_tasks]  # 스토리 순서대로 정렬
+            if reference:
+                reference.report()
+            character_image = await character_task
+            yield "complete", await story_store.save(request, await self.finalize_images(CompleteStoryResponse(
+                story=Story(title=title, scenes=scenes),
+                character_image=character_image,
+                total_scenes=len(scenes)
+            )))
+        finally:
+            # 클라이언트 연결이 끊긴 경우 남은 작업 정리
+            for task in [story_task, character_task, *scene_tasks]:
+                if not task.done():
+                    task.cancel()
+    
+    async def stream_complete_story(self, request: StoryRequest, facial_features: str = None):
+        """동화를 이벤트 단위로 스트리밍 생성 (제목 → 완성된 장면 순 → 완료)"""
+        print(f"🌊 스트리밍 동화 생성 시작: {request.child_profile.name}, 테마: {request.theme}")
+        
+        async for kind, value in self.iter_story_pipeline(request, facial_features):
+            if kind == "scene":
+                print(f"📤 장면 {value.scene_number} 전송")
+            elif kind == "complete":
+                print(f"🎉 스트리밍 동화 생성 완료! '{value.story.title}'")
+            yield self.story_event(kind, value)
+    
+    def story_event(self, kind: str, value: Any) -> Dict[str, Any]:
+        """파이프라인 이벤트 (종류, 값)를 스트리밍 응답용 dict로 변환"""
+        if kind == "title":
+            return {"event": "title", "title": value}
+        if kind == "scene":
+            return {"event": "scene", "scene": value.model_dump()}
+        return {
+            "event": "complete",
+            "story_id": value.story_id,
+            "title": value.story.title,
+            "character_image": value.character_image,
+            "total_scenes": value.total_scenes
+        }
     
     async def generate_complete_story(self, request: StoryRequest, facial_features: str = None) -> CompleteStoryResponse:
         """OpenAI 모델들을 사용한 완전한 동화 생성 (사진 분석 결과 포함)"""
+        span = start_stage("story_total", settings.STORY_MODEL)
         try:
             print(f"🚀 OpenAI 완전 동화 생성 시작: {request.child_profile.name}, 테마: {request.theme}")
             if facial_features:
                 print(f"👶 사진 분석 결과 적용: {facial_features[:50]}...")
             
-            # 1. GPT-4o로 스토리 생성 (사진 분석 결과 포함)
-            story_data = await self.generate_story_with_gpt4o_mini(request, facial_features)
-            
-            # 2. 상세한 캐릭터 디스크립션 생성
-            character_description = self.generate_detailed_character_description(
-                request.child_profile.name, 
-                request.child_profile.age, 
-                request.child_profile.gender,
-                facial_features
-            )
-            
-            # 3. Gen ID 기반 캐릭터 일관성 유지 시스템
-            scenes = []
-            reference_gen_id = None
-            
-            for i, scene_data in enumerate(story_data.get("scenes", [])[:6]):  # 최대 6개 장면
-                scene_num = scene_data.get("scene_number", i + 1)
-                scene_text = scene_data.get("text", "")
-                base_image_prompt = scene_data.get("image_prompt", f"Children's book illustration, scene {scene_num}")
+            if settings.SCENE_FANOUT:
+                # 스토리 텍스트 스트리밍과 장면별 이미지/음성 생성을 동시에 진행
+                async for kind, value in self.iter_story_pipeline(request, facial_features):
+                    if kind == "complete":
+                        response = value
+                story = response.story
+                scenes = story.scenes
+            else:
+                # 1. GPT-4o로 스토리 생성 (사진 분석 결과 포함)
+                story_data = await self.generate_story_with_gpt4o_mini(request)
                 
-                # 이미지 생성
-                if os.getenv("GENERATE_IMAGES", "false").lower() == "true":
-                    enhanced_prompt = self.enhance_prompt_for_consistency(
-                        base_image_prompt, 
-                        character_description, 
-                        scene_num
-                    )
-                    
-                    # 2D 동화책 스타일 강조 (3D 방지)
-                    enhanced_prompt = f"2D flat illustration, watercolor children's book art style, NOT 3D: {enhanced_prompt}"
-                    
-                    if scene_num == 1:
-                        # Scene 1: 기준 캐릭터 생성 및 gen_id 저장
-                        image_url, reference_gen_id = await self.generate_image_with_dalle3(enhanced_prompt, scene_num)
-                        print(f"🎯 Scene 1 기준 이미지 생성 완료, Gen ID: {reference_gen_id}")
-                    else:
-                        # Scene 2-6: gen_id 참조하여 캐릭터 일관성 유지
-                        image_url, _ = await self.generate_image_with_dalle3(enhanced_prompt, scene_num, reference_gen_id)
-                        print(f"🎨 Scene {scene_num} 이미지 생성 완료 (Gen ID 참조)")
-                    
-                else:
-                    # 플레이스홀더 이미지 사용 (비용 절약)
-                    colors = ["8B5CF6", "EC4899", "F59E0B", "10B981", "3B82F6", "8B5A2B"]
-                    color = colors[scene_num % len(colors)]
-                    image_url = f"https://picsum.photos/1024/1024?random={scene_num}&blur=1"
-                    print(f"💰 비용 절약을 위해 장면 {scene_num}에 플레이스홀더 이미지 사용")
+                # 2. 상세한 캐릭터 디스크립션 생성
+                character_description = self.generate_detailed_character_description(
+                    request.child_profile.name, 
+                    request.child_profile.age, 
+                    request.child_profile.gender,
+                    facial_features
+                )
                 
-                # TTS-1로 음성 생성
-                audio_url = await self.generate_audio_with_tts1(scene_text, scene_num, request.child_profile.name)
+                # 3. 장면별 이미지/음성 순차 생성
+                scene_specs = self.extract_scene_specs(story_data)
+                generate_images = os.getenv("GENERATE_IMAGES", "false").lower() == "true"
+                scenes, character_image = await self.generate_scene_media_sequential(
+                    request, scene_specs, character_description, generate_images
+                )
                 
-                scene = StoryScene(
-                    scene_number=scene_num,
-                    text=scene_text,
-                    image_url=image_url,
-                    audio_url=audio_url
+                # 4. 최종 스토리 구성
+                story = Story(
+                    title=story_data.get("title", f"{request.child_profile.name}의 {request.theme} 이야기"),
+                    scenes=scenes
                 )
-                scenes.append(scene)
-            
-            # 3. 최종 스토리 구성
-            story = Story(
-                title=story_data.get("title", f"{request.child_profile.name}의 {request.theme} 이야기"),
-                scenes=scenes
-            )
-            
-            # 캐릭터 이미지도 생성 (선택적)
-            if os.getenv("GENERATE_IMAGES", "false").lower() == "true":
-                character_prompt = f"2D flat illustration, watercolor children's book art style, NOT 3D: Children's book character illustration of {request.child_profile.name}, a {request.child_profile.age}-year-old Korean {request.child_profile.gender}, watercolor style, friendly and warm"
-                character_image, _ = await self.generate_image_with_dalle3(character_prompt, 0)  # tuple에서 URL만 추출
-            else:
-                character_image = f"https://picsum.photos/1024/1024?random=character&blur=2"
-            
-            response = CompleteStoryResponse(
-                story=story,
-                character_image=character_image,
-                total_scenes=len(scenes)
-            )
+                
+                response = await story_store.save(request, await self.finalize_images(CompleteStoryResponse(
+                    story=story,
+                    character_image=character_image,
+                    total_scenes=len(scenes)
+                )))
+                story = response.story
+                scenes = story.scenes
             
             print(f"🎉 OpenAI 완전 동화 생성 완료! '{story.title}' (총 {len(scenes)}개 장면)")
+            span.outcome = "success"
             return response
             
         except Exception as e:
             print(f"❌ OpenAI 완전 동화 생성 실패: {str(e)}")
             raise e
+        finally:
+            span.finish()
 
 # 전역 서비스 인스턴스
 openai_story_service = OpenAIStoryService()
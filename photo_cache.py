@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import settings
+
+
+class PhotoAnalysisCache:
+    """사진 다이제스트 기반 얼굴 특징 분석 결과 캐시
+
+    메모리(LRU, 최대 max_entries개)에 먼저 보관하고, directory가 지정되면
+    `<다이제스트>.json` 파일로도 저장하여 재시작 후에도 재사용한다.
+    ttl_seconds가 지난 항목은 조회 시 만료 처리된다.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, directory: str = ""):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.directory = directory
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(photo: str, child_age: int) -> str:
+        """사진 데이터와 나이(분석 프롬프트에 포함됨)로 캐시 키 생성"""
+        return hashlib.sha256(f"{child_age}\x00{photo}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.memory.get(key)
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None or time.time() - entry["created_at"] > self.ttl_seconds:
+            if entry is not None:
+                await self.invalidate(key)
+            self.misses += 1
+            return None
+
+        self.memory.move_to_end(key)
+        self.hits += 1
+        return entry["facial_features"]
+
+    async def put(self, key: str, facial_features: str):
+        entry = {"facial_features": facial_features, "created_at": time.time()}
+        self._remember(key, entry)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    async def invalidate(self, key: str):
+        self.memory.pop(key, None)
+        if self.directory:
+            await asyncio.to_thread(self._remove_disk, key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.memory),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as entry_file:
+                return json.load(entry_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]):
+        # 워커 여러 개가 같은 사진을 동시에 분석해도 겹치지 않도록 고유한 임시 파일 사용
+        temp_path = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as entry_file:
+                json.dump(entry, entry_file, ensure_ascii=False)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _remove_disk(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+# 전역 사진 분석 캐시 인스턴스
+photo_analysis_cache = PhotoAnalysisCache(
+    ttl_seconds=settings.PHOTO_CACHE_TTL_SECONDS,
+    max_entries=settings.PHOTO_CACHE_MAX_ENTRIES,
+    directory=settings.PHOTO_CACHE_DIR
+)
@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+import aiofiles
+
+from config import settings
+
+PHOTO_ID_PATTERN = re.compile(r"^photo_[0-9a-f]{24}$")
+
+
+class PhotoStore:
+    """업로드된 아이 사진을 서버에 보관하고 짧은 사진 ID로 참조
+
+    사진 ID는 내용 해시에서 만들어지므로 같은 사진을 다시 올리면 같은 ID가 나온다.
+    아이 사진이므로 static 폴더가 아닌 별도 디렉토리에 저장하며, ttl_seconds가
+    지난 파일은 새 사진을 저장할 때 정리한다.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.last_cleanup = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def is_photo_id(value: Optional[str]) -> bool:
+        return bool(value) and PHOTO_ID_PATTERN.match(value) is not None
+
+    async def save(self, jpeg_bytes: bytes) -> str:
+        """JPEG 사진 저장 후 사진 ID 반환"""
+        photo_id = f"photo_{hashlib.sha256(jpeg_bytes).hexdigest()[:24]}"
+        path = self._path(photo_id)
+        if os.path.exists(path):
+            # 보관 기간 연장
+            os.utime(path)
+        else:
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            async with aiofiles.open(temp_path, "wb") as photo_file:
+                await photo_file.write(jpeg_bytes)
+            os.replace(temp_path, path)
+
+        if time.time() - self.last_cleanup > 3600:
+            self.last_cleanup = time.time()
+            await asyncio.to_thread(self._remove_expired)
+        return photo_id
+
+    async def load(self, photo_id: str) -> bytes:
+        if not self.is_photo_id(photo_id):
+            raise ValueError(f"잘못된 사진 ID입니다: {photo_id}")
+        try:
+            async with aiofiles.open(self._path(photo_id), "rb") as photo_file:
+                return await photo_file.read()
+        except FileNotFoundError:
+            raise ValueError(f"사진을 찾을 수 없습니다 (만료되었거나 존재하지 않음): {photo_id}")
+
+    async def resolve_data_url(self, photo: str) -> str:
+        """사진 ID면 data URL로 변환 (이미 data URL/URL이면 그대로 반환)"""
+        if not self.is_photo_id(photo):
+            return photo
+        photo_bytes = await self.load(photo)
+        return f"data:image/jpeg;base64,{base64.b64encode(photo_bytes).decode('utf-8')}"
+
+    def _path(self, photo_id: str) -> str:
+        return os.path.join(self.directory, f"{photo_id}.jpg")
+
+    def _remove_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# 전역 사진 저장소 인스턴스
+photo_store = PhotoStore(settings.PHOTO_STORE_DIR, settings.PHOTO_STORE_TTL_SECONDS)
@@ -0,0 +1,93 @@
+import os
+from typing import Dict
+
+from config import settings
+
+# 장면별 플레이스홀더 배경색 (장면 번호 순서대로 순환)
+PLACEHOLDER_COLORS = ["8B5CF6", "EC4899", "F59E0B", "10B981", "3B82F6", "8B5A2B"]
+
+SCENE_SVG_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" width="1024" height="1024" viewBox="0 0 1024 1024">
+<defs><linearGradient id="bg" x1="0" y1="0" x2="1" y2="1"><stop offset="0" stop-color="#{start}"/><stop offset="1" stop-color="#{end}"/></linearGradient></defs>
+<rect width="1024" height="1024" fill="url(#bg)"/>
+<circle cx="{sun_x}" cy="230" r="110" fill="#FFFFFF" fill-opacity="0.35"/>
+<ellipse cx="260" cy="1010" rx="520" ry="300" fill="#FFFFFF" fill-opacity="0.18"/>
+<ellipse cx="820" cy="1050" rx="480" ry="320" fill="#FFFFFF" fill-opacity="0.24"/>
+<text x="512" y="560" font-family="sans-serif" font-size="160" text-anchor="middle" fill="#FFFFFF" fill-opacity="0.8">{label}</text>
+</svg>
+"""
+
+CHARACTER_SVG_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" width="1024" height="1024" viewBox="0 0 1024 1024">
+<defs><radialGradient id="bg" cx="0.5" cy="0.4" r="0.75"><stop offset="0" stop-color="#{start}"/><stop offset="1" stop-color="#{end}"/></radialGradient></defs>
+<rect width="1024" height="1024" fill="url(#bg)"/>
+<circle cx="512" cy="400" r="150" fill="#FFFFFF" fill-opacity="0.6"/>
+<path d="M272 880 Q272 620 512 620 Q752 620 752 880 Z" fill="#FFFFFF" fill-opacity="0.6"/>
+</svg>
+"""
+
+
+def render_scene_svg(scene_number: int) -> str:
+    """장면 플레이스홀더 SVG (팔레트 색에서 다음 색으로 이어지는 그라데이션, 문자열 치환만 하므로 요청마다 만들어도 됨)"""
+    index = scene_number % len(PLACEHOLDER_COLORS)
+    return SCENE_SVG_TEMPLATE.format(
+        start=PLACEHOLDER_COLORS[index],
+        end=PLACEHOLDER_COLORS[(index + 1) % len(PLACEHOLDER_COLORS)],
+        sun_x=200 + 125 * index,
+        label=scene_number
+    )
+
+
+def render_character_svg() -> str:
+    """캐릭터 플레이스홀더 SVG (인물 실루엣)"""
+    return CHARACTER_SVG_TEMPLATE.format(start=PLACEHOLDER_COLORS[0], end=PLACEHOLDER_COLORS[1])
+
+
+class PlaceholderImages:
+    """외부 서비스 없이 로컬에서 만든 플레이스홀더 이미지 (이미지 생성 비활성화 / 생성 실패 시)
+
+    장면 번호마다 SVG를 처음 요청될 때 한 번만 `<directory>/scene-<번호>.svg`로 저장하고
+    이후에는 메모리에 기억한 `/static/placeholders/...` URL을 바로 돌려준다.
+    """
+
+    def __init__(self, directory: str, url_prefix: str = "/static/placeholders"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.urls: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def scene_url(self, scene_number: int) -> str:
+        """장면 플레이스홀더 URL"""
+        name = f"scene-{scene_number}.svg"
+        url = self.urls.get(name)
+        if url is None:
+            url = self._save(name, render_scene_svg(scene_number))
+        return url
+
+    def character_url(self) -> str:
+        """캐릭터 플레이스홀더 URL"""
+        url = self.urls.get("character.svg")
+        if url is None:
+            url = self._save("character.svg", render_character_svg())
+        return url
+
+    def _save(self, name: str, svg: str) -> str:
+        # 1KB 남짓한 파일을 이름마다 한 번만 쓰므로 이벤트 루프에서 바로 처리
+        path = os.path.join(self.directory, name)
+        data = svg.encode("utf-8")
+        try:
+            with open(path, "rb") as existing:
+                unchanged = existing.read() == data
+        except FileNotFoundError:
+            unchanged = False
+        if not unchanged:
+            # 워커 여러 개가 동시에 써도 깨진 파일이 보이지 않도록 임시 파일로 쓰고 교체
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as placeholder_file:
+                placeholder_file.write(data)
+            os.replace(temp_path, path)
+        url = f"{self.url_prefix}/{name}"
+        self.urls[name] = url
+        return url
+
+
+# 전역 플레이스홀더 이미지 인스턴스
+placeholder_images = PlaceholderImages(settings.PLACEHOLDER_DIR)
@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import openai
+
+from config import settings
+
+# 공정 대기열 단위 (동화 1편). 동화 밖에서 호출되면 "shared"로 묶임
+current_story: contextvars.ContextVar[str] = contextvars.ContextVar("current_story", default="shared")
+
+# 호출 종류별 (분당 요청 수, 분당 토큰 수) 한도 (0이면 제한 없음)
+RATE_LIMITS = {
+    "chat": (settings.CHAT_RPM, settings.CHAT_TPM),
+    "image": (settings.IMAGE_RPM, 0),
+    "tts": (settings.TTS_RPM, 0),
+}
+
+# 429 응답을 받을 때 줄이는 비율과 성공할 때마다 회복하는 양 (AIMD)
+BACKOFF_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_RATE_SCALE = 0.1
+
+# 비전 요청의 이미지 1장 토큰 추정치
+IMAGE_INPUT_TOKENS = 800
+
+
+def story_context(story_key: str) -> contextvars.Context:
+    """동화 1편의 호출을 같은 공정 대기열로 묶는 컨텍스트 (create_task(..., context=)에 전달)"""
+    context = contextvars.copy_context()
+    context.run(current_story.set, story_key)
+    return context
+
+
+class TokenBucket:
+    """분당 한도를 초 단위로 나눠 채우는 토큰 버킷"""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute * burst_seconds / 60)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, scale: float):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60 * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float) -> float:
+        """amount만큼 쌓일 때까지 남은 시간 (초)"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.per_minute / 60 * scale)
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class ModelRateLimiter:
+    """모델 하나의 요청/토큰 한도를 지키며 대기 중인 호출을 동화별로 번갈아 허용
+
+    429 응답을 받으면 retry-after 동안 모든 호출을 멈추고 채우는 속도를 절반으로 줄였다가,
+    성공할 때마다 조금씩 원래 속도로 회복한다.
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, burst_seconds: float):
+        self.model = model
+        self.request_bucket = TokenBucket(rpm, burst_seconds) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm, burst_seconds) if tpm > 0 else None
+        self.waiters: "OrderedDict[str, Deque[Tuple[asyncio.Future, int]]]" = OrderedDict()
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.blocked_until = 0.0
+        self.scale = 1.0
+        self.granted = 0
+        self.rate_limited = 0
+
+    def wait_time(self, tokens: int) -> float:
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket:
+                bucket.refill(self.scale)
+                wait = max(wait, bucket.wait_time(amount, self.scale))
+        return wait
+
+    def grant(self, tokens: int):
+        if self.request_bucket:
+            self.request_bucket.take(1)
+        if self.token_bucket:
+            self.token_bucket.take(tokens)
+        self.granted += 1
+
+    async def acquire(self, tokens: int, owner: str):
+        """한도 안에서 호출 허가를 받을 때까지 대기"""
+        if not self.waiters and self.wait_time(tokens) == 0:
+            self.grant(tokens)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(owner, deque()).append((future, tokens))
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self.waiters:
+            owner, queue = next(iter(self.waiters.items()))
+            future, tokens = queue[0]
+            if future.done():
+                # 대기 중 취소된 호출
+                queue.popleft()
+                if not queue:
+                    del self.waiters[owner]
+                continue
+
+            wait = self.wait_time(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            queue.popleft()
+            self.grant(tokens)
+            future.set_result(None)
+            # 라운드 로빈: 같은 동화의 다음 호출은 다른 동화들 뒤로
+            del self.waiters[owner]
+            if queue:
+                self.waiters[owner] = queue
+
+    def penalize(self, retry_after: float):
+        """429 응답 반영: retry_after 동안 중지, 이후 속도 감소"""
+        self.rate_limited += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.scale = max(MIN_RATE_SCALE, self.scale * BACKOFF_FACTOR)
+
+    def record_success(self):
+        self.scale = min(1.0, self.scale + RECOVERY_STEP)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(len(queue) for queue in self.waiters.values()),
+            "stories_waiting": len(self.waiters),
+            "rate_scale": round(self.scale, 2),
+            "granted": self.granted,
+            "rate_limited": self.rate_limited
+        }
+
+
+def estimate_tokens(kind: str, request: Dict[str, Any]) -> int:
+    """TPM 계산용 토큰 추정 (입력 글자 수 / 2 + 최대 출력 토큰)"""
+    if kind != "chat":
+        return 0
+    characters = 0
+    images = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                characters += len(part["text"])
+            else:
+                images += 1
+    return characters // 2 + images * IMAGE_INPUT_TOKENS + request.get("max_tokens", 1000)
+
+
+def retry_after_seconds(error: openai.APIStatusError, default: float = 1.0) -> float:
+    """retry-after-ms / retry-after 헤더 해석 (없으면 default)"""
+    headers = error.response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+class OpenAIScheduler:
+    """모든 동화가 공유하는 OpenAI 호출 스케줄러 (모델별 한도, 동화별 공정 대기열)
+
+    한도는 서버 프로세스 하나 기준이므로 SERVER_WORKERS로 나눠서 적용한다.
+    """
+
+    def __init__(self):
+        self.limiters: Dict[str, ModelRateLimiter] = {}
+
+    def limiter(self, kind: str, model: str) -> ModelRateLimiter:
+        if model not in self.limiters:
+            rpm, tpm = RATE_LIMITS[kind]
+            workers = max(1, settings.SERVER_WORKERS)
+            self.limiters[model] = ModelRateLimiter(
+                model, rpm / workers, tpm / workers, settings.RATE_LIMIT_BURST_SECONDS
+            )
+        return self.limiters[model]
+
+    async def call(self, kind: str, func: Callable, **request) -> Any:
+        """한도 안에서 OpenAI API 호출 (429면 retry-after만큼 기다렸다가 대기열에 다시 들어감)
+
+        그 밖의 일시적 오류 재시도는 retry_policy.call_with_policy가 담당
+
+        await openai_scheduler.call("chat", client.chat.completions.create, model=..., messages=...)
+        """
+        limiter = self.limiter(kind, request.get("model", kind)) if settings.RATE_LIMITS_ENABLED else None
+        tokens = estimate_tokens(kind, request)
+        owner = current_story.get()
+        rate_limited = 0
+        while True:
+            if limiter:
+                await limiter.acquire(tokens, owner)
+            try:
+                result = await func(**request)
+            except openai.RateLimitError as e:
+                rate_limited += 1
+                delay = retry_after_seconds(e)
+                if rate_limited > settings.RATE_LIMIT_MAX_RETRIES:
+                    raise
+                print(f"⏳ {request.get('model', kind)} 요청 한도 초과, {delay:.1f}초 후 재시도 ({rate_limited}/{settings.RATE_LIMIT_MAX_RETRIES})")
+                if limiter:
+                    limiter.penalize(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            if limiter:
+                limiter.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: limiter.stats() for model, limiter in self.limiters.items()}
+
+
+# 전역 OpenAI 호출 스케줄러 인스턴스
+openai_scheduler = OpenAIScheduler()
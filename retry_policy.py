@@ -0,0 +1,155 @@
+import asyncio
+import random
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+
+import openai
+
+from config import settings
+from rate_limiter import openai_scheduler
+
+# 다시 시도하면 성공할 수 있는 오류 (429는 openai_scheduler가 retry-after에 맞춰 따로 처리)
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+# p95 계산에 쓸 최근 응답 수, 최소 표본 수
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class RetryPolicy:
+    """단계별 재시도 정책
+
+    deadline: 재시도와 백오프 대기를 모두 포함한 단계 전체 제한 시간 (초)
+    hedge_delay: 표본이 부족할 때 사용할 중복 요청 시작 시간 (None이면 중복 요청 안 함)
+    """
+
+    def __init__(self, deadline: float, max_attempts: int, hedge_delay: float = None):
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_delay = hedge_delay
+
+
+# 단계 이름은 metrics의 stage 라벨과 같음
+RETRY_POLICIES = {
+    "photo_analysis": RetryPolicy(settings.PHOTO_ANALYSIS_DEADLINE, settings.RETRY_MAX_ATTEMPTS),
+    "story_llm": RetryPolicy(settings.STORY_DEADLINE, settings.RETRY_MAX_ATTEMPTS),
+    "character_image": RetryPolicy(settings.IMAGE_DEADLINE, settings.RETRY_MAX_ATTEMPTS),
+    "scene_image": RetryPolicy(settings.IMAGE_DEADLINE, settings.RETRY_MAX_ATTEMPTS),
+    "scene_image_edit": RetryPolicy(settings.IMAGE_DEADLINE, settings.RETRY_MAX_ATTEMPTS),
+    # 같은 입력이면 같은 결과인 TTS만 느린 요청을 중복 요청으로 보완
+    "scene_tts": RetryPolicy(settings.TTS_DEADLINE, settings.RETRY_MAX_ATTEMPTS, hedge_delay=settings.TTS_HEDGE_DELAY),
+}
+
+
+class LatencyTracker:
+    """단계별 최근 응답 시간과 중복 요청 비율"""
+
+    def __init__(self):
+        self.samples: Dict[str, Deque[float]] = {}
+        self.calls: Dict[str, int] = {}
+        self.hedges: Dict[str, int] = {}
+        self.hedge_wins: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, stage: str, default: float) -> float:
+        samples = self.samples.get(stage)
+        if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+            return default
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_allowed(self, stage: str) -> bool:
+        """중복 요청이 전체 호출의 HEDGE_MAX_RATIO를 넘지 않도록 제한"""
+        return self.hedges.get(stage, 0) < settings.HEDGE_MAX_RATIO * max(1, self.calls.get(stage, 0))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            stage: {
+                "p95_seconds": round(self.p95(stage, 0.0), 2),
+                "calls": self.calls.get(stage, 0),
+                "hedges": self.hedges.get(stage, 0),
+                "hedge_wins": self.hedge_wins.get(stage, 0)
+            }
+            for stage in self.calls
+        }
+
+
+latency_tracker = LatencyTracker()
+
+
+def backoff_delay(attempt: int) -> float:
+    """지수 백오프 + 전체 지터 (attempt는 1부터)"""
+    return random.uniform(0, min(settings.RETRY_MAX_DELAY, settings.RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+async def hedged_call(stage: str, policy: RetryPolicy, kind: str, func: Callable, request: Dict[str, Any], granted: asyncio.Event) -> Any:
+    """첫 요청이 p95 시간 안에 끝나지 않으면 같은 요청을 한 번 더 보내고 먼저 성공한 응답 사용
+
+    p95 시간은 호출 한도 대기열을 통과한 시점(granted)부터 잰다.
+    """
+    primary = asyncio.create_task(openai_scheduler.call(kind, func, **request))
+    tasks = {primary}
+    granted_wait = asyncio.create_task(granted.wait())
+    try:
+        await asyncio.wait({primary, granted_wait}, return_when=asyncio.FIRST_COMPLETED)
+        done, _ = await asyncio.wait(tasks, timeout=latency_tracker.p95(stage, policy.hedge_delay))
+        if not done and latency_tracker.hedge_allowed(stage):
+            latency_tracker.hedges[stage] = latency_tracker.hedges.get(stage, 0) + 1
+            print(f"🪞 {stage} 응답 지연, 중복 요청 전송")
+            tasks.add(asyncio.create_task(openai_scheduler.call(kind, func, **request)))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        latency_tracker.hedge_wins[stage] = latency_tracker.hedge_wins.get(stage, 0) + 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        granted_wait.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_policy(stage: str, kind: str, func: Callable, **request) -> Any:
+    """단계 정책에 따라 OpenAI 호출 (일시적 오류 재시도, 단계 제한 시간, TTS 중복 요청)
+
+    제한 시간과 응답 시간은 호출 한도 대기열을 통과한 뒤부터 계산한다 (한도 대기는 openai_scheduler 몫).
+    await call_with_policy("scene_tts", "tts", client.audio.speech.create, model=..., input=...)
+    """
+    policy = RETRY_POLICIES[stage]
+    loop = asyncio.get_running_loop()
+    deadline = None
+    granted = asyncio.Event()
+    latency_tracker.calls[stage] = latency_tracker.calls.get(stage, 0) + 1
+
+    async def timed_call(**kwargs):
+        nonlocal deadline
+        if deadline is None:
+            deadline = loop.time() + policy.deadline
+        granted.set()
+        started = loop.time()
+        result = await asyncio.wait_for(func(**kwargs), timeout=max(0.0, deadline - loop.time()))
+        latency_tracker.record(stage, loop.time() - started)
+        return result
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if policy.hedge_delay is not None and settings.HEDGE_ENABLED:
+                return await hedged_call(stage, policy, kind, timed_call, request, granted)
+            return await openai_scheduler.call(kind, timed_call, **request)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{stage} 단계 제한 시간 {policy.deadline:g}초 초과")
+        except RETRYABLE_ERRORS as e:
+            delay = backoff_delay(attempt)
+            if attempt >= policy.max_attempts or loop.time() + delay >= deadline:
+                raise
+            print(f"🔁 {stage} 일시적 오류, {delay:.1f}초 후 재시도 ({attempt}/{policy.max_attempts - 1}): {type(e).__name__}")
+            await asyncio.sleep(delay)
@@ -1,8 +1,18 @@
 #!/usr/bin/env python3
 """
 FaiRY TALE 백엔드 서버 시작 스크립트
+
+기본은 운영 모드로, gunicorn이 앱을 미리 불러온 뒤 CPU 코어 수만큼 uvicorn
+워커 프로세스를 띄운다. 종료 신호를 받으면 새 연결을 받지 않고 진행 중인
+동화 생성이 끝날 때까지 기다린다. 코드 수정 시 자동 재시작이 필요하면 --dev.
+
+    python start.py              # 운영 모드 (WEB_CONCURRENCY개 워커)
+    python start.py --workers 8
+    python start.py --dev        # 개발 모드 (단일 프로세스, reload)
 """
+import argparse
 import os
+import shutil
 import sys
 from pathlib import Path
 
@@ -46,8 +56,126 @@ def check_env_file():
     print("환경변수 설정이 완료되었습니다.")
     return True
 
+def server_options(workers: int) -> dict:
+    """운영 모드 서버 설정 (환경변수로 조정)"""
+    return {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "workers": workers,
+        "keep_alive": int(os.getenv("SERVER_KEEP_ALIVE", "30")),  # 유휴 keep-alive 연결 유지 시간
+        "backlog": int(os.getenv("SERVER_BACKLOG", "2048")),  # 대기 가능한 미수락 연결 수
+        # 종료 시 진행 중인 요청/작업을 기다리는 최대 시간 (JOB_DRAIN_TIMEOUT보다 길게)
+        "graceful_timeout": int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "120")),
+        "log_level": os.getenv("LOG_LEVEL", "info")
+    }
+
+
+def prepare_worker_environment(workers: int):
+    """앱을 불러오기 전에 워커 프로세스 수에 맞춰 환경변수 조정"""
+    cores = os.cpu_count() or 1
+    # 워커마다 이미지 처리 프로세스 풀이 생기므로 전체가 코어 수를 넘지 않게 나눔
+    if not os.getenv("IMAGE_PROCESS_WORKERS"):
+        os.environ["IMAGE_PROCESS_WORKERS"] = str(max(1, cores // workers))
+
+    # OpenAI 호출 한도를 워커 수만큼 나눠 적용 (config.SERVER_WORKERS)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    if workers > 1:
+        # 작업 상태를 모든 워커가 볼 수 있도록 공유 SQLite 사용
+        if not os.getenv("JOB_DB_PATH"):
+            os.environ["JOB_DB_PATH"] = str(project_root / "jobs.sqlite3")
+            print(f"작업 저장소: {os.environ['JOB_DB_PATH']} (워커 간 공유)")
+        # 실행 중 작업은 다른 워커 소유일 수 있으므로 각 워커는 대기 작업만 가져감
+        os.environ["JOB_RECOVER_RUNNING"] = "false"
+
+        # Prometheus 지표를 워커 프로세스 전체에서 합산 (prometheus_client를 불러오기 전에 설정해야 함)
+        multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR") or str(project_root / ".prometheus_multiproc")
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+
+
+def run_production(options: dict):
+    """gunicorn + uvicorn 워커로 실행 (앱 미리 로드, 종료 시 진행 중 요청 완료 대기)"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # gunicorn 미지원 환경(Windows 등)에서는 uvicorn 자체 멀티 프로세스 사용
+        print("gunicorn이 없어 uvicorn 멀티 워커로 실행합니다 (앱 미리 로드 없음).")
+        import uvicorn
+        uvicorn.run(
+            "demo_main:app",
+            host=options["host"],
+            port=options["port"],
+            workers=options["workers"],
+            log_level=options["log_level"],
+            backlog=options["backlog"],
+            timeout_keep_alive=options["keep_alive"],
+            timeout_graceful_shutdown=options["graceful_timeout"]
+        )
+        return
+
+    def on_starting(server):
+        # 이전 실행에서 중단된 작업은 워커를 띄우기 전에 마스터에서 한 번만 되돌림
+        if os.getenv("JOB_DB_PATH"):
+            from job_queue import requeue_interrupted_jobs
+            requeue_interrupted_jobs(os.environ["JOB_DB_PATH"])
+
+    def child_exit(server, worker):
+        # 종료된 워커의 진행 중 작업 수(gauge) 지표 정리
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(worker.pid)
+
+    class FairyTaleApplication(BaseApplication):
+        def __init__(self, config: dict):
+            self.config = config
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.config.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from demo_main import app
+            return app
+
+    FairyTaleApplication({
+        "bind": f"{options['host']}:{options['port']}",
+        "workers": options["workers"],
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "keepalive": options["keep_alive"],
+        "backlog": options["backlog"],
+        "graceful_timeout": options["graceful_timeout"],
+        "loglevel": options["log_level"],
+        "on_starting": on_starting,
+        "child_exit": child_exit
+    }).run()
+
+
+def run_development():
+    """개발 모드 (단일 프로세스, 파일 변경 시 자동 재시작)"""
+    import uvicorn
+    
+    uvicorn.run(
+        "demo_main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        log_level="info",
+        reload=True,
+        timeout_keep_alive=30,
+        timeout_graceful_shutdown=30
+    )
+
+
 def main():
     """서버 시작"""
+    parser = argparse.ArgumentParser(description="FaiRY TALE 백엔드 서버")
+    parser.add_argument("--dev", action="store_true", help="개발 모드 (reload, 단일 프로세스)")
+    parser.add_argument("--workers", type=int, help="워커 프로세스 수 (기본: WEB_CONCURRENCY 또는 CPU 코어 수)")
+    args = parser.parse_args()
+    
     print("FaiRY TALE 백엔드 서버를 시작합니다...")
     print("=" * 50)
     
@@ -58,26 +186,25 @@ def main():
     if not check_env_file():
         return
     
+    dev_mode = args.dev or os.getenv("SERVER_MODE", "production").lower() == "development"
+    workers = 1 if dev_mode else (args.workers or int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    options = server_options(workers)
+    
     print("서버를 시작합니다...")
-    print("서버 주소: http://localhost:8000")
-    print("API 문서: http://localhost:8000/docs")
+    print(f"서버 주소: http://{options['host']}:{options['port']}")
+    print(f"API 문서: http://{options['host']}:{options['port']}/docs")
+    print(f"실행 모드: {'개발 (reload)' if dev_mode else f'운영 (워커 {workers}개)'}")
     print("OpenAI API 사용")
     print("이미지 생성 제어: GENERATE_IMAGES=true/false")
     print("=" * 50)
     
     # 서버 시작
     try:
-        import uvicorn
-        
-        uvicorn.run(
-            "demo_main:app",
-            host="0.0.0.0",
-            port=8000,
-            log_level="info",
-            reload=True,
-            timeout_keep_alive=30,
-            timeout_graceful_shutdown=30
-        )
+        if dev_mode:
+            run_development()
+        else:
+            prepare_worker_environment(workers)
+            run_production(options)
     except KeyboardInterrupt:
         print("\n서버를 종료합니다.")
     except Exception as e:
@@ -0,0 +1,101 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class StreamingStoryParser:
+    """GPT 스트리밍 응답에서 동화 JSON을 점진적으로 파싱
+
+    응답 조각을 feed()로 넣으면 최상위 "title" 값과 "scenes" 배열의 각 장면
+    객체가 닫히는 즉시 이벤트로 돌려준다. 문자열 내부의 괄호와 이스케이프 문자는
+    무시하며, JSON 앞뒤의 설명 문장이나 ```json 코드 블록도 허용한다.
+    """
+
+    def __init__(self):
+        self.text = ""  # 지금까지 받은 전체 응답
+        self.title: Optional[str] = None
+        self.scenes: List[Dict[str, Any]] = []
+
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._expect_value = False
+        self._in_scenes = False
+        self._scene_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """응답 조각을 추가하고 새로 완성된 이벤트 목록을 반환"""
+        self.text += chunk
+        events = []
+
+        while self._pos < len(self.text):
+            index = self._pos
+            char = self.text[index]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._on_string_end(index, events)
+                continue
+
+            if not self._stack:
+                # 첫 번째 '{' 이전의 텍스트는 무시
+                if char == "{":
+                    self._stack.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ":" and len(self._stack) == 1:
+                self._expect_value = True
+            elif char == "," and len(self._stack) == 1:
+                self._expect_value = False
+            elif char in "{[":
+                if len(self._stack) == 1 and char == "[" and self._last_key == "scenes":
+                    self._in_scenes = True
+                elif self._in_scenes and len(self._stack) == 2 and char == "{":
+                    self._scene_start = index
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if self._in_scenes and len(self._stack) == 2 and char == "}" and self._scene_start is not None:
+                    self._on_scene_end(index, events)
+                elif self._in_scenes and len(self._stack) == 1:
+                    self._in_scenes = False
+                if not self._stack:
+                    # 최상위 객체가 닫히면 이후 텍스트는 무시
+                    self._pos = len(self.text)
+                    break
+
+        return events
+
+    def _on_string_end(self, index: int, events: List[Dict[str, Any]]):
+        """최상위 객체의 키/값 문자열 처리"""
+        if len(self._stack) != 1:
+            return
+        value = json.loads(self.text[self._string_start:index + 1])
+        if not self._expect_value:
+            self._last_key = value
+        elif self._last_key == "title" and self.title is None:
+            self.title = value
+            events.append({"type": "title", "title": value})
+
+    def _on_scene_end(self, index: int, events: List[Dict[str, Any]]):
+        """장면 객체 하나가 닫혔을 때 파싱하여 이벤트 추가"""
+        scene_text = self.text[self._scene_start:index + 1]
+        self._scene_start = None
+        try:
+            scene = json.loads(scene_text)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ 장면 JSON 파싱 실패, 건너뜀: {str(e)}")
+            return
+        self.scenes.append(scene)
+        events.append({"type": "scene", "scene": scene})
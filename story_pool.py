@@ -0,0 +1,307 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from audio_cache import audio_cache
+from config import settings
+from metrics import start_stage
+from models import ChildProfile, StoryRequest, StoryScene, Story, CompleteStoryResponse
+from openai_service import openai_story_service
+from rate_limiter import story_context
+from themes import theme_registry
+
+# 미리 만드는 동화의 주인공 이름 자리 (개인화할 때 아이 이름으로 바꿈)
+NAME_PLACEHOLDER = "[[NAME]]"
+# 이미지 프롬프트에서는 이름 대신 사용 (사진 없는 요청의 그림은 이름과 무관)
+GENERIC_CHARACTER = "the child"
+
+# (최소 나이, 최대 나이) 연령대, 동화는 연령대 가운데 나이 기준으로 생성
+AGE_BANDS = ((3, 4), (5, 6), (7, 9))
+GENDERS = ("boy", "girl")
+
+# 이름 뒤 조사: 받침 있을 때 / 없을 때
+JOSA_FORMS = {
+    "은": ("은", "는"), "는": ("은", "는"),
+    "이": ("이", "가"), "가": ("이", "가"),
+    "을": ("을", "를"), "를": ("을", "를"),
+    "과": ("과", "와"), "와": ("과", "와"),
+    "아": ("아", "야"), "야": ("아", "야"),
+    "이랑": ("이랑", "랑"), "랑": ("이랑", "랑"),
+    "으로": ("으로", "로"), "로": ("으로", "로"),
+}
+# "[[NAME]]이는"처럼 이름 뒤에 붙인 "이"(민준이는/지우는)와 조사
+NAME_PATTERN = re.compile(
+    re.escape(NAME_PLACEHOLDER) + r"(이(?=[는가를와랑의도에야]))?(이랑|으로|은|는|이|가|을|를|과|와|아|야|랑|로)?"
+)
+RIEUL = 8  # 종성 ㄹ (ㄹ 받침 뒤에는 "로")
+
+PoolKey = Tuple[str, Tuple[int, int], str]
+
+
+def final_consonant(name: str) -> int:
+    """이름 마지막 글자의 종성 번호 (받침 없음/한글 아님 = 0)"""
+    if name and "가" <= name[-1] <= "힣":
+        return (ord(name[-1]) - ord("가")) % 28
+    return 0
+
+
+def personalize_text(text: str, name: str) -> str:
+    """이름 자리를 아이 이름으로 바꾸고 받침에 맞게 조사 조정"""
+    jong = final_consonant(name)
+
+    def replace(match: re.Match) -> str:
+        nickname, josa = match.groups()
+        if nickname:
+            # 받침 있는 이름만 "이"를 붙이고, 뒤 조사는 모음 뒤 형태
+            return name + ("이" if jong else "") + (JOSA_FORMS[josa][1] if josa else "")
+        if not josa:
+            return name
+        with_final, without_final = JOSA_FORMS[josa]
+        if josa in ("으로", "로"):
+            return name + (with_final if jong and jong != RIEUL else without_final)
+        return name + (with_final if jong else without_final)
+
+    return NAME_PATTERN.sub(replace, text)
+
+
+def age_band(age: int) -> Tuple[int, int]:
+    """나이가 속한 연령대 (범위 밖이면 가장 가까운 연령대)"""
+    for band in AGE_BANDS:
+        if age <= band[1]:
+            return band
+    return AGE_BANDS[-1]
+
+
+def normalize_gender(gender: Optional[str]) -> str:
+    return "girl" if (gender or "").lower() in ["여자", "female", "girl"] else "boy"
+
+
+def parse_theme_depths(spec: str) -> Dict[str, int]:
+    """"friendship_skills:4,financial_literacy:1" → {테마 value: 보관 수}"""
+    depths = {}
+    for item in spec.split(","):
+        if ":" in item:
+            value, depth = item.split(":", 1)
+            depths[value.strip()] = int(depth)
+    return depths
+
+
+class PooledStory:
+    """이름 자리가 남아 있는 미리 만든 동화 (이름이 나오지 않는 장면은 음성까지 준비됨)"""
+
+    def __init__(self, title: str, scenes: List[StoryScene], character_image: str):
+        self.title = title
+        self.scenes = scenes
+        self.character_image = character_image
+        self.created_at = time.time()
+
+
+class StoryPool:
+    """(테마, 연령대, 성별)별 미리 만든 동화 풀과 백그라운드 보충 작업
+
+    사진 없는 첫 동화 요청은 풀에서 하나를 꺼내 이름만 바꾸고, 이름이 나오는 장면의 음성만 새로 만든다.
+    보관 수는 서버 프로세스 하나 기준이므로 SERVER_WORKERS로 나눠서 적용한다.
+    """
+
+    def __init__(self, enabled: bool, depth: int, theme_depths: Dict[str, int], refill_per_minute: float, concurrency: int, max_age_seconds: float):
+        self.enabled = enabled
+        self.depth = depth
+        self.theme_depths = theme_depths
+        self.refill_interval = 60 / refill_per_minute if refill_per_minute > 0 else 0
+        self.concurrency = max(1, concurrency)
+        self.max_age_seconds = max_age_seconds
+        self.pools: Dict[PoolKey, Deque[PooledStory]] = {
+            (theme.value, band, gender): deque()
+            for theme in theme_registry.themes for band in AGE_BANDS for gender in GENDERS
+        }
+        self.filling: Dict[PoolKey, int] = {key: 0 for key in self.pools}
+        self.fill_tasks: Set[asyncio.Task] = set()
+        self.warmer: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+
+    def target_depth(self, key: PoolKey) -> int:
+        depth = self.theme_depths.get(key[0], self.depth)
+        return math.ceil(depth / max(1, settings.SERVER_WORKERS))
+
+    @staticmethod
+    def pool_key(request: StoryRequest) -> Optional[PoolKey]:
+        theme = theme_registry.resolve(request.theme)
+        if theme is None:
+            return None
+        return theme.value, age_band(request.child_profile.age), normalize_gender(request.child_profile.gender)
+
+    async def start(self):
+        """풀 보충 작업 시작 (STORY_POOL_ENABLED=false면 아무것도 하지 않음)"""
+        if not self.enabled:
+            return
+        self.wakeup = asyncio.Event()
+        # 풀 보충 호출은 모두 하나의 공정 대기열 단위로 묶여 실제 요청과 번갈아 처리됨
+        self.warmer = asyncio.create_task(self._warm_loop(), context=story_context("story_pool"))
+        total = sum(self.target_depth(key) for key in self.pools)
+        print(f"🧺 동화 풀 보충 시작 (목표 {total}편, 분당 최대 {settings.STORY_POOL_REFILL_PER_MINUTE:g}편)")
+
+    async def stop(self):
+        tasks = [task for task in [self.warmer, *self.fill_tasks] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.warmer = None
+        self.fill_tasks.clear()
+
+    async def take(self, request: StoryRequest) -> Optional[CompleteStoryResponse]:
+        """사진 없는 요청이면 풀에서 동화를 꺼내 아이 이름으로 개인화 (없으면 None)"""
+        if self.warmer is None or request.child_profile.photo or request.seed is not None:
+            return None
+        key = self.pool_key(request)
+        if key is None:
+            return None
+
+        span = start_stage("story_pool")
+        try:
+            pool = self.pools[key]
+            pooled = None
+            while pool:
+                candidate = pool.popleft()
+                if time.time() - candidate.created_at <= self.max_age_seconds:
+                    pooled = candidate
+                    break
+            self.wakeup.set()
+            if pooled is None:
+                self.misses += 1
+                span.outcome = "miss"
+                return None
+
+            self.hits += 1
+            story = await self._personalize(pooled, request.child_profile.name)
+            print(f"⚡ 미리 만든 동화 사용: '{story.story.title}' ({span.elapsed():.2f}초)")
+            span.outcome = "hit"
+            return story
+        finally:
+            span.finish()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.warmer is not None,
+            "stories": sum(len(pool) for pool in self.pools.values()),
+            "target": sum(self.target_depth(key) for key in self.pools),
+            "filling": len(self.fill_tasks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "generated": self.generated,
+            "failed": self.failed
+        }
+
+    async def _personalize(self, pooled: PooledStory, name: str) -> CompleteStoryResponse:
+        bounded = openai_story_service.create_media_limiter()
+
+        async def personalize_scene(scene: StoryScene) -> StoryScene:
+            text = personalize_text(scene.text, name)
+            audio_url = scene.audio_url
+            if not audio_url or not audio_cache.touch(audio_url):
+                # 이름이 나오는 장면만 음성 생성 (나머지는 풀에서 미리 만든 음성 사용, 캐시 정리로 삭제됐으면 다시 생성)
+                audio_url = await bounded(openai_story_service.generate_audio_with_tts1(text, scene.scene_number, name))
+            return scene.model_copy(update={"text": text, "audio_url": audio_url})
+
+        scenes = await asyncio.gather(*(personalize_scene(scene) for scene in pooled.scenes))
+        return CompleteStoryResponse(
+            story=Story(title=personalize_text(pooled.title, name), scenes=list(scenes)),
+            character_image=pooled.character_image,
+            total_scenes=len(scenes)
+        )
+
+    def _most_needed(self) -> Optional[PoolKey]:
+        """채워야 할 동화가 가장 많이 모자란 풀 (모두 찼으면 None)"""
+        best_key, best_shortage = None, 0
+        for key, pool in self.pools.items():
+            shortage = self.target_depth(key) - len(pool) - self.filling[key]
+            if shortage > best_shortage:
+                best_key, best_shortage = key, shortage
+        return best_key
+
+    async def _warm_loop(self):
+        while True:
+            self.wakeup.clear()
+            key = self._most_needed() if len(self.fill_tasks) < self.concurrency else None
+            if key is None:
+                # 풀에서 동화를 꺼내거나 보충이 끝나면 다시 확인
+                await self.wakeup.wait()
+                continue
+
+            self.filling[key] += 1
+            task = asyncio.create_task(self._fill(key))
+            self.fill_tasks.add(task)
+            task.add_done_callback(self.fill_tasks.discard)
+            await asyncio.sleep(self.refill_interval)
+
+    async def _fill(self, key: PoolKey):
+        theme_value, band, gender = key
+        theme = theme_registry.by_value[theme_value]
+        age = (band[0] + band[1]) // 2
+        request = StoryRequest(child_profile=ChildProfile(name=NAME_PLACEHOLDER, age=age, gender=gender), theme=theme.title)
+        generic_request = StoryRequest(child_profile=ChildProfile(name=GENERIC_CHARACTER, age=age, gender=gender), theme=theme.title)
+        try:
+            story_data = await openai_story_service.generate_story_with_gpt4o_mini(request)
+            scene_specs = openai_story_service.extract_scene_specs(story_data)
+            if len(scene_specs) < settings.MAX_SCENES:
+                raise ValueError(f"장면 {len(scene_specs)}개뿐인 동화")
+
+            generate_images = os.getenv("GENERATE_IMAGES", "false").lower() == "true"
+            bounded = openai_story_service.create_media_limiter()
+            reference = openai_story_service.create_scene_reference(generate_images)
+            character_description = openai_story_service.generate_detailed_character_description(GENERIC_CHARACTER, age, gender)
+            scene_tasks = [
+                openai_story_service.generate_scene_media(
+                    generic_request,
+                    (scene_num, text, image_prompt.replace(NAME_PLACEHOLDER, GENERIC_CHARACTER)),
+                    character_description,
+                    generate_images,
+                    bounded,
+                    generate_audio=NAME_PLACEHOLDER not in text,
+                    reference=reference
+                )
+                for scene_num, text, image_prompt in scene_specs
+            ]
+            character_image, *scenes = await asyncio.gather(
+                openai_story_service.generate_character_image(generic_request, generate_images, bounded),
+                *scene_tasks
+            )
+            if reference:
+                reference.report()
+            # 풀에 오래 머무는 동안 원격 이미지 URL이 만료되지 않도록 로컬 저장본으로 교체
+            pooled = await openai_story_service.finalize_images(CompleteStoryResponse(
+                story=Story(title=story_data.get("title", f"{NAME_PLACEHOLDER}의 {theme.title} 이야기"), scenes=scenes),
+                character_image=character_image,
+                total_scenes=len(scenes)
+            ))
+            self.pools[key].append(PooledStory(pooled.story.title, pooled.story.scenes, pooled.character_image))
+            self.generated += 1
+            print(f"🧺 동화 풀 보충: {theme.title} {band[0]}~{band[1]}세 {gender} ({len(self.pools[key])}/{self.target_depth(key)})")
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ 동화 풀 보충 실패 ({theme.title} {band[0]}~{band[1]}세 {gender}): {str(e)}")
+            # 연속 실패 시 같은 풀을 바로 다시 시도하지 않도록 잠시 대기
+            await asyncio.sleep(self.refill_interval)
+        finally:
+            self.filling[key] -= 1
+            self.wakeup.set()
+
+
+# 전역 동화 풀 인스턴스
+story_pool = StoryPool(
+    enabled=settings.STORY_POOL_ENABLED,
+    depth=settings.STORY_POOL_DEPTH,
+    theme_depths=parse_theme_depths(settings.STORY_POOL_THEME_DEPTHS),
+    refill_per_minute=settings.STORY_POOL_REFILL_PER_MINUTE,
+    concurrency=settings.STORY_POOL_CONCURRENCY,
+    max_age_seconds=settings.STORY_POOL_MAX_AGE_SECONDS
+)
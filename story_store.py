@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from config import settings
+from models import StoryRequest, CompleteStoryResponse
+
+# 만료 파일 정리 간격 (초), 쓰다 만 임시 파일을 정리하기까지 기다리는 시간 (초)
+CLEANUP_INTERVAL = 3600
+STALE_TEMP_SECONDS = 3600
+
+
+class StoryStore:
+    """완성된 동화 저장소 (다시 보기, 같은 요청 재생성 시 파이프라인 생략)
+
+    story_id → CompleteStoryResponse를 메모리(LRU, 최대 max_entries개)와
+    `<directory>/<story_id>.json` 파일에 보관하고 ttl_seconds가 지나면 만료한다.
+    seed가 있는 요청은 (프로필, 테마, seed) 지문 → story_id도 함께 기록하여
+    fingerprint_ttl_seconds 동안 같은 요청에 저장된 동화를 그대로 돌려준다.
+    만료된 파일은 읽을 때 지우고, 서버 시작 후 첫 저장부터 CLEANUP_INTERVAL마다 한꺼번에 정리한다.
+    """
+
+    def __init__(self, directory: str, max_entries: int, ttl_seconds: float, fingerprint_ttl_seconds: float):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint_ttl_seconds = fingerprint_ttl_seconds
+        self.memory: "OrderedDict[str, Tuple[CompleteStoryResponse, float]]" = OrderedDict()
+        self.fingerprints: Dict[str, Tuple[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_cleanup = 0.0
+        if directory:
+            os.makedirs(os.path.join(directory, "fingerprints"), exist_ok=True)
+
+    @staticmethod
+    def make_fingerprint(request: StoryRequest) -> Optional[str]:
+        """(프로필, 테마, seed) 지문 (seed가 없으면 매번 새 동화이므로 None)"""
+        if request.seed is None:
+            return None
+        profile = request.child_profile
+        payload = json.dumps(
+            [profile.name, profile.age, profile.gender, profile.photo, request.theme, request.seed],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, story_id: str) -> Optional[CompleteStoryResponse]:
+        """story_id로 저장된 동화 조회 (없거나 만료되면 None)"""
+        entry = self.memory.get(story_id)
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self._read_story, story_id)
+            if entry is not None:
+                self._remember(story_id, entry)
+
+        if entry is None or time.time() - entry[1] > self.ttl_seconds:
+            if entry is not None:
+                await self.invalidate(story_id)
+            return None
+
+        self.memory.move_to_end(story_id)
+        return entry[0]
+
+    async def find(self, request: StoryRequest) -> Optional[CompleteStoryResponse]:
+        """같은 지문으로 만든 동화가 있으면 반환 (seed 없는 요청은 항상 None)"""
+        fingerprint = self.make_fingerprint(request)
+        if fingerprint is None:
+            return None
+
+        entry = self.fingerprints.get(fingerprint)
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self._read_fingerprint, fingerprint)
+        story = None
+        if entry is not None and time.time() - entry[1] <= self.fingerprint_ttl_seconds:
+            story = await self.get(entry[0])
+
+        if story is None:
+            if entry is not None:
+                # 만료됐거나 가리키는 동화가 없어진 지문은 바로 삭제
+                await self._forget_fingerprint(fingerprint)
+            self.misses += 1
+            return None
+        self.fingerprints[fingerprint] = entry
+        self.hits += 1
+        print(f"♻️ 저장된 동화 재사용: {story.story_id} '{story.story.title}'")
+        return story
+
+    async def save(self, request: StoryRequest, response: CompleteStoryResponse) -> CompleteStoryResponse:
+        """동화에 story_id를 붙여 저장 (저장 실패해도 동화는 그대로 반환)"""
+        story = response.model_copy(update={"story_id": uuid.uuid4().hex})
+        created_at = time.time()
+        self._remember(story.story_id, (story, created_at))
+        fingerprint = self.make_fingerprint(request)
+        if fingerprint is not None:
+            self.fingerprints[fingerprint] = (story.story_id, created_at)
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write_story, story, created_at, fingerprint)
+            except OSError as e:
+                print(f"⚠️ 동화 저장 실패: {str(e)}")
+            if time.time() - self.last_cleanup > CLEANUP_INTERVAL:
+                self.last_cleanup = time.time()
+                removed = await asyncio.to_thread(self._remove_expired)
+                if removed:
+                    print(f"🧹 만료된 동화 파일 {removed}개 정리")
+        return story
+
+    async def invalidate(self, story_id: str):
+        self.memory.pop(story_id, None)
+        if self.directory:
+            await asyncio.to_thread(self._remove_file, self._story_path(story_id))
+
+    async def _forget_fingerprint(self, fingerprint: str):
+        self.fingerprints.pop(fingerprint, None)
+        if self.directory:
+            await asyncio.to_thread(self._remove_file, self._fingerprint_path(fingerprint))
+
+    @staticmethod
+    async def replay(story: CompleteStoryResponse) -> AsyncIterator[Tuple[str, Any]]:
+        """저장된 동화를 생성 파이프라인과 같은 ("title") → ("scene") × N → ("complete") 이벤트로 재생"""
+        yield "title", story.story.title
+        for scene in story.story.scenes:
+            yield "scene", scene
+        yield "complete", story
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.memory),
+            "max_entries": self.max_entries,
+            "fingerprint_hits": self.hits,
+            "fingerprint_misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _remember(self, story_id: str, entry: Tuple[CompleteStoryResponse, float]):
+        self.memory[story_id] = entry
+        self.memory.move_to_end(story_id)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _story_path(self, story_id: str) -> str:
+        return os.path.join(self.directory, f"{story_id}.json")
+
+    def _fingerprint_path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, "fingerprints", f"{fingerprint}.json")
+
+    def _read_story(self, story_id: str) -> Optional[Tuple[CompleteStoryResponse, float]]:
+        # 경로 조작 방지 (story_id는 uuid4 hex)
+        if not story_id.isalnum():
+            return None
+        data = self._read_json(self._story_path(story_id))
+        if data is None:
+            return None
+        return CompleteStoryResponse.model_validate(data["story"]), data["created_at"]
+
+    def _read_fingerprint(self, fingerprint: str) -> Optional[Tuple[str, float]]:
+        data = self._read_json(self._fingerprint_path(fingerprint))
+        if data is None:
+            return None
+        return data["story_id"], data["created_at"]
+
+    def _write_story(self, story: CompleteStoryResponse, created_at: float, fingerprint: Optional[str]):
+        self._write_json(self._story_path(story.story_id), {"story": story.model_dump(), "created_at": created_at})
+        if fingerprint is not None:
+            self._write_json(self._fingerprint_path(fingerprint), {"story_id": story.story_id, "created_at": created_at})
+
+    def _remove_expired(self) -> int:
+        """만료된 동화/지문 파일과 오래된 임시 파일 삭제 (파일은 저장 후 다시 쓰지 않으므로 수정 시각 = 저장 시각)"""
+        now = time.time()
+        for fingerprint in [key for key, (_, created_at) in self.fingerprints.items() if now - created_at > self.fingerprint_ttl_seconds]:
+            del self.fingerprints[fingerprint]
+
+        removed = 0
+        for directory, ttl_seconds in (
+            (self.directory, self.ttl_seconds),
+            (os.path.join(self.directory, "fingerprints"), self.fingerprint_ttl_seconds)
+        ):
+            with os.scandir(directory) as scanned:
+                for entry in scanned:
+                    if not entry.is_file():
+                        continue
+                    try:
+                        age = now - entry.stat().st_mtime
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(".tmp"):
+                        expired = age > STALE_TEMP_SECONDS
+                    else:
+                        expired = entry.name.endswith(".json") and age > ttl_seconds
+                    if expired:
+                        self._remove_file(entry.path)
+                        removed += 1
+        return removed
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as entry_file:
+                return json.load(entry_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]):
+        # 워커 여러 개가 같은 지문 파일을 동시에 써도 겹치지 않도록 고유한 임시 파일 사용
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as entry_file:
+            json.dump(data, entry_file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# 전역 동화 저장소 인스턴스
+story_store = StoryStore(
+    directory=settings.STORY_STORE_DIR,
+    max_entries=settings.STORY_STORE_MAX_ENTRIES,
+    ttl_seconds=settings.STORY_STORE_TTL_SECONDS,
+    fingerprint_ttl_seconds=settings.STORY_FINGERPRINT_TTL_SECONDS
+)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+class Theme(NamedTuple):
+    """교육 테마 하나 (/themes 응답 정보 + 동화 프롬프트 가이드라인)"""
+    value: str
+    title: str
+    emoji: str
+    description: str
+    moral: str
+    keywords: Tuple[str, ...]
+    color: str
+    bg_color: str
+    examples: Tuple[str, ...]
+    # 동화 프롬프트 가이드라인
+    context: str
+    key_lessons: Tuple[str, ...]
+    characters: str
+    setting: str
+    # 매번 다른 이야기가 나오도록 무작위로 고르는 변형 요소
+    variation_themes: Tuple[str, ...]
+    variation_scenarios: Tuple[str, ...]
+
+    @property
+    def label(self) -> str:
+        return f"{self.emoji} {self.title}"
+
+    def to_api(self) -> Dict[str, Any]:
+        """/themes 응답 형식"""
+        return {
+            "value": self.value,
+            "title": self.title,
+            "emoji": self.emoji,
+            "label": self.label,
+            "description": self.description,
+            "moral": self.moral,
+            "keywords": list(self.keywords),
+            "color": self.color,
+            "bgColor": self.bg_color,
+            "examples": list(self.examples)
+        }
+
+
+# 모든 테마 정보는 여기에서만 정의 (/themes 응답, 요청 검증, 프롬프트 생성이 함께 사용)
+THEMES = (
+    Theme(
+        value="healthy_eating",
+        title="식습관 개선",
+        emoji="🥕",
+        description="균형 잡힌 영양 섭취의 중요성을 배워요",
+        moral="건강한 몸을 위해서는 다양한 음식을 골고루 먹어야 해요",
+        keywords=("건강", "영양", "균형"),
+        color="from-green-400 to-emerald-600",
+        bg_color="bg-green-50",
+        examples=("🥬 채소 친구들의 모험", "🍎 과일 왕국 여행", "🥛 우유와 칼슘 요정"),
+        context="건강한 식습관의 중요성을 배우는",
+        key_lessons=("다양한 음식 골고루 먹기", "편식하지 않기", "건강한 간식 선택"),
+        characters="영양소 요정들, 건강한 음식 친구들",
+        setting="마법의 음식 나라나 건강 레스토랑",
+        variation_themes=(
+            "편식을 극복하는", "건강한 간식을 선택하는", "다양한 음식을 탐험하는",
+            "영양 균형을 맞추는", "올바른 식사 예절을 배우는", "물을 충분히 마시는"
+        ),
+        variation_scenarios=(
+            "영양소 요정들과 모험하는", "마법의 음식 왕국을 탐험하는", "건강한 요리사가 되는",
+            "무지개 채소밭을 가꾸는", "영양 탐정이 되는", "건강 레스토랑을 운영하는"
+        )
+    ),
+    Theme(
+        value="friendship_skills",
+        title="교우관계",
+        emoji="🤝",
+        description="친구 사귀기와 갈등 해결 방법을 배워요",
+        moral="진정한 우정은 서로를 이해하고 배려하는 마음에서 시작돼요",
+        keywords=("우정", "화해", "소통"),
+        color="from-blue-400 to-sky-600",
+        bg_color="bg-blue-50",
+        examples=("🌈 화해의 무지개", "🎭 새친구 환영 파티", "🤲 마음을 나누는 다리"),
+        context="친구들과의 올바른 관계 형성을 배우는",
+        key_lessons=("배려와 나눔", "협력의 중요성", "다름 인정하기"),
+        characters="다양한 성격의 친구들, 지혜로운 선생님",
+        setting="학교, 놀이터, 친구들과의 모험",
+        variation_themes=(
+            "새로운 친구를 사귀는", "갈등을 평화롭게 해결하는", "친구와 나누는 기쁨을 배우는",
+            "다름을 인정하고 받아들이는", "협력의 소중함을 깨닫는", "배려하는 마음을 기르는"
+        ),
+        variation_scenarios=(
+            "우정의 다리를 만드는", "마음을 나누는 정원에서", "협력의 마법을 배우는",
+            "친구 구출 대모험", "우정의 보물을 찾는", "마음의 문을 여는"
+        )
+    ),
+    Theme(
+        value="safety_habits",
+        title="안전습관",
+        emoji="🛡️",
+        description="일상 속에서 안전을 지키는 방법을 배워요",
+        moral="안전 수칙을 지키는 것은 나와 다른 사람을 보호하는 일이에요",
+        keywords=("안전", "조심", "보호"),
+        color="from-red-400 to-orange-600",
+        bg_color="bg-red-50",
+        examples=("🚦 신호등 친구의 가르침", "👮 안전 경찰관과 모험", "🏠 우리 집 안전 점검"),
+        context="일상생활에서의 안전 수칙을 배우는",
+        key_lessons=("교통안전 지키기", "화재 예방", "놀이 안전"),
+        characters="안전 수호천사, 경찰관, 소방관",
+        setting="집, 학교, 길거리, 놀이터",
+        variation_themes=(
+            "교통안전을 지키는", "집에서 안전하게 생활하는", "낯선 사람을 조심하는",
+            "놀이터에서 안전하게 노는", "응급상황에 대처하는", "인터넷을 안전하게 사용하는"
+        ),
+        variation_scenarios=(
+            "안전 수호천사와 함께하는", "안전 탐정이 되어", "안전 마법사로 변신하는",
+            "안전 왕국을 지키는", "위험 괴물을 물리치는", "안전 히어로가 되는"
+        )
+    ),
+    Theme(
+        value="financial_literacy",
+        title="경제관념",
+        emoji="💰",
+        description="용돈 관리와 저축하는 방법을 배워요",
+        moral="계획적인 소비와 저축은 미래를 준비하는 지혜로운 습관이에요",
+        keywords=("저축", "계획", "현명함"),
+        color="from-yellow-400 to-amber-600",
+        bg_color="bg-yellow-50",
+        examples=("🐷 저금통 돼지의 여행", "💎 보물섬의 지혜", "🏪 꼬마 상인의 이야기"),
+        context="돈의 소중함과 올바른 소비 습관을 배우는",
+        key_lessons=("저축의 중요성", "필요와 욕구 구분", "계획적 소비"),
+        characters="돼지 저금통, 은행원, 현명한 할머니",
+        setting="상점, 은행, 집안에서의 용돈 관리",
+        variation_themes=(
+            "저축의 소중함을 배우는", "필요와 욕구를 구분하는", "용돈을 계획적으로 사용하는",
+            "돈의 가치를 이해하는", "현명한 소비를 배우는", "나눔의 기쁨을 아는"
+        ),
+        variation_scenarios=(
+            "저금통 요정과 모험하는", "경제 왕국을 탐험하는", "현명한 상인이 되는",
+            "돈의 비밀을 파헤치는", "저축 마법사가 되는", "경제 탐정으로 활약하는"
+        )
+    ),
+    Theme(
+        value="emotional_intelligence",
+        title="감정표현",
+        emoji="💝",
+        description="감정을 이해하고 올바르게 표현하는 방법을 배워요",
+        moral="내 마음을 표현하고 다른 사람의 마음을 이해하는 것이 중요해요",
+        keywords=("감정", "공감", "소통"),
+        color="from-pink-400 to-rose-600",
+        bg_color="bg-pink-50",
+        examples=("😊 감정 요정들의 여행", "🤗 마음을 나누는 숲", "💕 위로의 마법사"),
+        context="자신의 감정을 올바르게 표현하는 방법을 배우는",
+        key_lessons=("감정 인식하기", "건전한 표현 방법", "타인 감정 이해"),
+        characters="감정 요정들, 이해심 많은 가족",
+        setting="가정, 감정의 정원, 마음의 세계",
+        variation_themes=(
+            "기쁨과 슬픔을 균형있게 표현하는", "화가 날 때 올바르게 대처하는", "무서움을 극복하는",
+            "부끄러움을 이겨내는", "실망감을 다루는", "질투심을 조절하는"
+        ),
+        variation_scenarios=(
+            "감정 요정들을 만나는", "마음의 정원을 가꾸는", "감정 색깔을 찾는",
+            "마음의 날씨를 바꾸는", "감정 동물 친구들과 놀이하는", "마음의 보석을 찾는"
+        )
+    )
+)
+
+# 알 수 없는 테마는 이 테마의 가이드라인 사용
+DEFAULT_THEME = "교우관계"
+
+
+class ThemeRegistry:
+    """테마 조회 테이블과 미리 직렬화한 /themes 응답 (모듈 로드 시 한 번만 생성)"""
+
+    def __init__(self, themes: Tuple[Theme, ...], default_title: str):
+        self.themes = themes
+        self.by_value = MappingProxyType({theme.value: theme for theme in themes})
+        # 한글 이름과 라벨("🥕 식습관 개선") 모두 조회 가능
+        self.by_title = MappingProxyType({
+            **{theme.title: theme for theme in themes},
+            **{theme.label: theme for theme in themes}
+        })
+        self.default = self.by_title[default_title]
+        self.themes_json = json.dumps(
+            {"themes": [theme.to_api() for theme in themes]},
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.themes_json).hexdigest()[:32]}"'
+
+    def resolve(self, theme: str) -> Optional[Theme]:
+        """한글 이름, 라벨, 영어 value("healthy_eating") 중 무엇으로 와도 테마 찾기 (없으면 None)"""
+        key = theme.strip()
+        return self.by_title.get(key) or self.by_value.get(key.lower())
+
+    def canonical_title(self, theme: str) -> str:
+        """등록된 테마면 한글 이름으로 통일, 아니면 입력 그대로"""
+        resolved = self.resolve(theme)
+        return resolved.title if resolved else theme
+
+
+# 전역 테마 레지스트리 인스턴스
+theme_registry = ThemeRegistry(THEMES, DEFAULT_THEME)